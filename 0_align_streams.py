@@ -0,0 +1,134 @@
+"""
+
+This file aligns the two streams collected by "0_get_data_sensONE.py": the wrench from the
+SensONE (data_sensONE.csv) and the raw values from the 3D printed sensor (data_sensor.csv).
+
+Both streams are stamped with the same clock, but each device has its own delay. The time offset
+between them is estimated by cross-correlation: both streams are resampled on a uniform time grid
+(over the first seconds of the recording), and the lag maximizing the correlation between every
+wrench axis and every raw sensor channel is taken as the offset.
+
+Then the reference wrench is linearly interpolated on the timestamps of the 3D printed sensor
+(corrected by the offset). Long recordings are processed in chunks, so they never have to fit in memory.
+
+The results are stored in a csv file, each row containing the next values:
+< Timestamp, Fx, Fy, Fz, Mx, My, Mz, s0, s1, s2, s3, s4, s5, s6, s7 >
+
+"""
+
+import numpy as np
+import pandas as pd
+import sys
+
+# Input and output files
+reference_file = 'data_sensONE.csv'
+sensor_file = 'data_sensor.csv'
+output_file = 'data_aligned.csv'
+
+xcorr_window = 60.0  # seconds used to estimate the offset
+max_offset = 1.0  # seconds, maximum offset searched in both directions
+chunksize = 200000  # rows per chunk
+
+wrench_cols = ['Fx', 'Fy', 'Fz', 'Mx', 'My', 'Mz']
+sensor_cols = ['s0', 's1', 's2', 's3', 's4', 's5', 's6', 's7']
+
+# Function to read the rows of a csv file with Timestamp < t_end
+def read_head(file, cols, t_end):
+    chunks = []
+    for chunk in pd.read_csv(file, usecols=['Timestamp'] + cols, chunksize=chunksize):
+        chunks.append(chunk[chunk['Timestamp'] < t_end])
+        if chunk['Timestamp'].iloc[-1] >= t_end:
+            break
+    return pd.concat(chunks, ignore_index=True)
+
+# Function to estimate the offset d (seconds) such that sensor(t) corresponds to reference(t - d)
+# Cross-correlation of every (wrench axis, sensor channel) pair computed with FFT on a uniform grid
+def estimate_offset(t_ref, W, t_s, S, max_offset):
+    dt = np.median(np.diff(t_s))
+    t0, t1 = max(t_ref[0], t_s[0]), min(t_ref[-1], t_s[-1])
+    grid = np.arange(t0, t1, dt)
+    n = len(grid)
+    max_lag = min(int(round(max_offset / dt)), n - 1)
+
+    # Resample and normalize (zero mean, unit variance) each signal; constant signals are ignored
+    def resample(t, X):
+        Y = np.column_stack([np.interp(grid, t, X[:, k]) for k in range(X.shape[1])])
+        Y -= Y.mean(axis=0)
+        std = Y.std(axis=0)
+        return Y[:, std > 0] / std[std > 0]
+    W_g = resample(t_ref, W)
+    S_g = resample(t_s, S)
+    if W_g.shape[1] == 0 or S_g.shape[1] == 0:
+        raise ValueError('constant signals, the offset cannot be estimated')
+
+    # corr[lag] = sum over pairs of (sum_k S[k + lag] * W[k])^2, zero padded to avoid wrap-around
+    n_fft = 1 << int(np.ceil(np.log2(2 * n)))
+    W_f = np.fft.rfft(W_g, n_fft, axis=0)
+    S_f = np.fft.rfft(S_g, n_fft, axis=0)
+    corr = np.zeros(n_fft)
+    for i in range(W_f.shape[1]):
+        corr += (np.fft.irfft(S_f * np.conj(W_f[:, [i]]), n_fft, axis=0) ** 2).sum(axis=1)
+    lags = np.concatenate([np.arange(0, max_lag + 1), np.arange(-max_lag, 0)])
+    # Normalize by the number of overlapping samples at each lag (the sums are squared)
+    corr = corr[lags] / (n - np.abs(lags)) ** 2
+    # Sub-sample refinement of the peak with a parabola through its neighbours
+    k = np.argmax(corr)
+    shift = 0.0
+    if 0 < k < len(lags) - 1 and lags[k - 1] == lags[k] - 1 and lags[k + 1] == lags[k] + 1:
+        denom = corr[k - 1] - 2 * corr[k] + corr[k + 1]
+        if denom < 0:
+            shift = 0.5 * (corr[k - 1] - corr[k + 1]) / denom
+    return (lags[k] + shift) * dt
+
+# Function to yield the chunks of the reference stream, keeping the previous row to interpolate across chunks
+def aligned_chunks(offset):
+    ref_iter = pd.read_csv(reference_file, usecols=['Timestamp'] + wrench_cols, chunksize=chunksize)
+    t_ref = np.empty(0)
+    W_ref = np.empty((0, 6))
+    ref_done = False
+    for chunk in pd.read_csv(sensor_file, usecols=['Timestamp'] + sensor_cols, chunksize=chunksize):
+        t_s = chunk['Timestamp'].to_numpy() - offset  # sensor time in the reference clock
+        # Read reference rows until they cover the whole chunk
+        while not ref_done and (len(t_ref) == 0 or t_ref[-1] < t_s[-1]):
+            try:
+                ref = next(ref_iter)
+            except StopIteration:
+                ref_done = True
+                break
+            t_ref = np.concatenate([t_ref, ref['Timestamp'].to_numpy()])
+            W_ref = np.concatenate([W_ref, ref[wrench_cols].to_numpy()])
+        if len(t_ref) < 2:
+            break
+        # Keep only the sensor samples inside the reference time range
+        inside = (t_s >= t_ref[0]) & (t_s <= t_ref[-1])
+        W = np.column_stack([np.interp(t_s[inside], t_ref, W_ref[:, k]) for k in range(6)])
+        out = pd.DataFrame(W, columns=wrench_cols)
+        out.insert(0, 'Timestamp', chunk['Timestamp'].to_numpy()[inside])
+        out[sensor_cols] = chunk[sensor_cols].to_numpy()[inside]
+        yield out
+        # Drop the reference rows that are not needed anymore (keep one before the next chunk)
+        keep = max(np.searchsorted(t_ref, t_s[-1]) - 1, 0)
+        t_ref, W_ref = t_ref[keep:], W_ref[keep:]
+
+try:
+    # Estimate the offset over the first seconds of both streams
+    ref_head = read_head(reference_file, wrench_cols, xcorr_window)
+    sensor_head = read_head(sensor_file, sensor_cols, xcorr_window)
+    offset = estimate_offset(ref_head['Timestamp'].to_numpy(), ref_head[wrench_cols].to_numpy(),
+                             sensor_head['Timestamp'].to_numpy(), sensor_head[sensor_cols].to_numpy(dtype=float),
+                             max_offset)
+    print(f"Estimated offset: {offset * 1000:.1f} ms (sensor behind SensONE)")
+
+    # Interpolate the wrench on the sensor timestamps, chunk by chunk
+    n_rows = 0
+    for i, out in enumerate(aligned_chunks(offset)):
+        out.to_csv(output_file, mode='w' if i == 0 else 'a', header=(i == 0), index=False)
+        n_rows += len(out)
+    print(f"Saved {n_rows} aligned datapoints in '{output_file}'.")
+
+except KeyboardInterrupt:
+    # ctrl-C abort handling
+    print('Stopped.')
+except Exception as exp:
+    print("Exception. Something went wrong.")
+    sys.exit(1)
@@ -0,0 +1,172 @@
+"""
+
+This file looks for the jumps in the wrench values of the SensONE recordings (see Datasets/0_SensOne_jumps),
+which made the SensONE approach fail, instead of inspecting them by eye.
+
+For the csv recordings (Fx, Fy, Fz, Mx, My, Mz, and optionally Timestamp), each axis is scanned in chunks
+with a two-window test: at every row, the mean of the next w rows minus the mean of the previous w rows
+(computed with cumulative sums). A jump is reported where this difference is larger than a threshold
+relative to the noise of the axis (estimated with the median absolute difference between consecutive rows).
+
+For the txt recordings (mean wrench of each RUN), the jump between consecutive runs is reported.
+
+The jumps (file, axis, row, time, size) are printed and stored in a csv file. Optionally, a corrected
+copy of each csv recording is written, where the detected jumps are subtracted.
+
+"""
+
+import numpy as np
+import pandas as pd
+import glob
+import os
+import re
+import sys
+
+# Recordings to scan
+directory = 'Datasets/0_SensOne_jumps'
+output_file = f'{directory}/jumps.csv'
+
+window = 20  # rows before and after each candidate jump
+threshold = 10.0  # minimum jump size, in units of the standard deviation of the window mean difference
+chunksize = 1000000  # rows per chunk
+subtract_jumps = False  # write <file>_corrected.csv without the jumps
+
+wrench_cols = ['Fx', 'Fy', 'Fz', 'Mx', 'My', 'Mz']
+
+# Function to compute the difference between the mean of the next w rows and the previous w rows,
+# for every row i in [w, n - w] of X (n x 6)
+def window_mean_difference(X, w):
+    c = np.vstack([np.zeros((1, X.shape[1])), np.cumsum(X, axis=0)])
+    i = np.arange(w, len(X) - w + 1)
+    return (c[i + w] - 2 * c[i] + c[i - w]) / w, i
+
+# Function to estimate the noise standard deviation of each axis, robust to the jumps
+def noise_std(X):
+    d = np.abs(np.diff(X, axis=0))
+    sigma = 1.4826 * np.median(d, axis=0) / np.sqrt(2)
+    return np.maximum(sigma, np.finfo(float).eps)
+
+# Function to keep only the strongest candidate of each group of candidates closer than w rows (one per jump)
+def strongest_per_group(rows, scores, w):
+    order = np.argsort(rows)
+    rows, scores = rows[order], scores[order]
+    group = np.concatenate([[0], np.cumsum(np.diff(rows) >= w)])
+    # Sort by group and then by score, and take the last of each group
+    best = np.lexsort((scores, group))
+    last = np.concatenate([group[best][1:] != group[best][:-1], [True]])
+    return order[best[last]]
+
+# Function to scan one csv recording in chunks, and return the jumps of each axis
+def scan_csv(file):
+    candidates = []  # (axis, row, score, size)
+    tail = np.empty((0, 6))
+    tail_start = 0  # global row of the first row in tail
+    next_row = window  # first global row not tested yet
+    sigma = None  # noise of each axis, estimated on the first chunk
+    timestamps = []
+    for chunk in pd.read_csv(file, chunksize=chunksize):
+        if 'Timestamp' in chunk.columns:
+            timestamps.append(chunk['Timestamp'].to_numpy())
+        X = np.vstack([tail, chunk[wrench_cols].to_numpy(dtype=float)])
+        D, i = window_mean_difference(X, window)
+        rows = tail_start + i
+        new = rows >= next_row
+        D, rows = D[new], rows[new]
+        if sigma is None:
+            sigma = noise_std(X)
+        if len(rows) > 0:
+            score = np.abs(D) / (sigma * np.sqrt(2 / window))
+            r, axis = np.nonzero(score > threshold)
+            candidates.append(np.column_stack([axis, rows[r], score[r, axis], D[r, axis]]))
+            next_row = rows[-1] + 1
+        # Keep the last 2w rows for the next chunk
+        keep = min(2 * window, len(X))
+        tail_start += len(X) - keep
+        tail = X[len(X) - keep:]
+
+    jumps = []
+    if candidates:
+        candidates = np.vstack(candidates)
+        for axis in range(6):
+            c = candidates[candidates[:, 0] == axis]
+            if len(c) == 0:
+                continue
+            for k in strongest_per_group(c[:, 1].astype(int), c[:, 2], window):
+                row = int(c[k, 1])
+                jumps.append({'axis': wrench_cols[axis], 'row': row, 'score': c[k, 2], 'size': c[k, 3]})
+    timestamps = np.concatenate(timestamps) if timestamps else None
+    for jump in jumps:
+        jump['time'] = timestamps[jump['row']] if timestamps is not None else np.nan
+    return sorted(jumps, key=lambda j: (j['row'], j['axis']))
+
+# Function to subtract the jumps from a csv recording (chunk by chunk): every row after a jump is shifted by -size
+def subtract_csv(file, jumps):
+    out_file = file.replace('.csv', '_corrected.csv')
+    start = 0
+    for k, chunk in enumerate(pd.read_csv(file, chunksize=chunksize)):
+        rows = np.arange(start, start + len(chunk))
+        for axis in wrench_cols:
+            j_rows = np.array([j['row'] for j in jumps if j['axis'] == axis], dtype=int)
+            j_size = np.array([j['size'] for j in jumps if j['axis'] == axis])
+            # Accumulated jump size before each row
+            offset = np.concatenate([[0.0], np.cumsum(j_size)])[np.searchsorted(j_rows, rows, side='right')]
+            chunk[axis] = chunk[axis] - offset
+        chunk.to_csv(out_file, mode='w' if k == 0 else 'a', header=(k == 0), index=False)
+        start += len(chunk)
+
+# Function to read the mean wrench of each RUN of a txt recording, and return the jumps between runs
+def scan_txt(file):
+    jumps = []
+    section, run, values = None, None, {}
+    runs = []  # (section, run, [Fx, Fy, Fz, Mx, My, Mz])
+    with open(file) as f:
+        for line in f:
+            line = line.strip()
+            match_run = re.match(r'RUN (\d+):', line)
+            fields = line.split()
+            if match_run:
+                run, values = int(match_run.group(1)), {}
+            elif len(fields) == 2 and fields[0] in wrench_cols:
+                values[fields[0]] = float(fields[1])
+                if len(values) == 6:
+                    runs.append((section, run, [values[c] for c in wrench_cols]))
+            elif re.fullmatch(r'[A-Z]+(-[A-Z]+)*', line):
+                section = line  # e.g. X-AXIS-DOWN
+    for (s0, r0, w0), (s1, r1, w1) in zip(runs[:-1], runs[1:]):
+        if s0 != s1:
+            continue
+        for axis, size in zip(wrench_cols, np.subtract(w1, w0)):
+            jumps.append({'axis': axis, 'row': r1, 'score': np.nan, 'size': size, 'time': np.nan,
+                          'section': s1})
+    return jumps
+
+try:
+    results = []
+    for file in sorted(glob.glob(os.path.join(directory, '**', '*.*'), recursive=True)):
+        if file.endswith('_corrected.csv') or os.path.abspath(file) == os.path.abspath(output_file):
+            continue
+        if file.endswith('.csv'):
+            jumps = scan_csv(file)
+            if subtract_jumps:
+                subtract_csv(file, jumps)
+        elif file.endswith('.txt'):
+            jumps = scan_txt(file)
+        else:
+            continue
+        for jump in jumps:
+            results.append({'file': os.path.relpath(file, directory), **jump})
+        print(f"{os.path.relpath(file, directory)}: {len(jumps)} jumps")
+        for jump in jumps:
+            where = f"run {jump['row']} ({jump['section']})" if 'section' in jump else f"row {jump['row']}"
+            print(f"    {jump['axis']} at {where}: {jump['size']:+.4f}")
+
+    pd.DataFrame(results, columns=['file', 'section', 'axis', 'row', 'time', 'size', 'score']) \
+        .to_csv(output_file, index=False)
+    print(f"Saved {len(results)} jumps in '{output_file}'.")
+
+except KeyboardInterrupt:
+    # ctrl-C abort handling
+    print('Stopped.')
+except Exception as exp:
+    print("Exception. Something went wrong.")
+    sys.exit(1)
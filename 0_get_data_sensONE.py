@@ -2,11 +2,15 @@
 
 This file collects data from both SensONE and 3D printed sensor at the same time.
 
-For each timestamp, the wrench is collected from the SensONE (in its own frame)
-and the 8 raw sensor values are collected from the 3D printed sensor (s_0 to s_7).
+The wrench is collected from the SensONE (in its own frame) in the EtherCAT cycle,
+and the 8 raw sensor values are collected from the 3D printed sensor (s_0 to s_7) in a separate
+serial reader thread, so that each device runs at its own rate. Both use the same monotonic clock.
 
-The results are stored in a csv file, each row containing the next values:
-< Timestamp, Fx, Fy, Fz, Mx, My, Mz, s0, s1, s2, s3, s4, s5, s6, s7 >
+The results are stored in two csv files, each row containing the next values:
+data_sensONE.csv: < Timestamp, Fx, Fy, Fz, Mx, My, Mz >
+data_sensor.csv:  < Timestamp, seq_number, s0, s1, s2, s3, s4, s5, s6, s7 >
+
+The two streams can be aligned afterwards by their timestamps.
 
 """
 import math
@@ -22,7 +26,7 @@ import struct
 import csv
 import os
 
-import serial
+from fts_serial import SensorReader
 
 
 class MinimalExample:
@@ -30,6 +34,8 @@ class MinimalExample:
     BOTA_VENDOR_ID = 0xB07A
     BOTA_PRODUCT_CODE = 0x00000001
     SINC_LENGTH = 256
+    # Fx, Fy, Fz, Mx, My, Mz in the slave input buffer (little-endian floats)
+    WRENCH_STRUCT = struct.Struct('<6f')
     # The time step is set according to the sinc filter size
     time_step = 1.0;
 
@@ -114,75 +120,57 @@ class MinimalExample:
             try:
                 port = 'COM3'
                 baudrate = 115200
-                ser = serial.Serial(port, baudrate, parity=serial.PARITY_NONE)
-                print("Got the serial port.")
-
-                n_sensors = 8
-                overload_lower = 50
-                overload_upper = 950
 
-                datapoints = 0
                 start_datapoint = 10
                 total_datapoints = 1000 + start_datapoint
-                start_time = time.time()
+                start_time = time.monotonic()
+
+                # Serial reader thread: samples from the 3D printed sensor at its own rate
+                def on_sample(timestamp, seq_number, s):
+                    if reader.n_samples > start_datapoint:
+                        sensor_writer.writerow([timestamp, seq_number, *s])
+                reader = SensorReader(port, on_sample, t0=start_time, baudrate=baudrate)
+                reader.start()
+                print("Got the serial port.")
 
-                #while True:
-                while datapoints < total_datapoints:
+                # EtherCAT cycle (this thread): wrench from the SensONE at its own rate
+                datapoints = 0
+                next_cycle = time.monotonic()
+                while reader.n_samples < total_datapoints and reader.is_alive():
                     datapoints += 1
 
-                    # Get timestamp
-                    timestamp = (time.time() - start_time)
-
-                    # Get wrench
                     self._master.send_processdata()
                     self._master.receive_processdata(2000)
-                    sensor_input_as_bytes = self._master.slaves[0].input
-                    Fx = struct.unpack_from('f', sensor_input_as_bytes, 5)[0]
-                    Fy = struct.unpack_from('f', sensor_input_as_bytes, 9)[0]
-                    Fz = struct.unpack_from('f', sensor_input_as_bytes, 13)[0]
-                    Mx = struct.unpack_from('f', sensor_input_as_bytes, 17)[0]
-                    My = struct.unpack_from('f', sensor_input_as_bytes, 21)[0]
-                    Mz = struct.unpack_from('f', sensor_input_as_bytes, 25)[0]
-
-                    # Get raw sensor values
-                    try:
-                        data = ser.readline()
-                        (str_D, seq_number, error_mask, s0, s1, s2, s3, s4, s5, s6, s7) = \
-                            [t(s) for t, s in zip((str, int, int, int, int, int, int, int, int, int, int), data.split())]
-                    except ValueError:
-                        print("parsing input data failed, data='", data, "'")
-                        continue
-                    except IndexError:  # probably wrong formatted string...
-                        print("could not parse message/data:", data)
-                        continue
-
-                    s = [s0, s1, s2, s3, s4, s5, s6, s7]
-                    for i in range(n_sensors):
-                        if (s[i] < overload_lower) or (s[i] > overload_upper):
-                            print(f"Force overload channel {i}")
-                            continue
-
-                    # Print line
-                    # print('\n')
-                    # print(f"Fx: {Fx}, Fy: {Fy}, Fz: {Fz}, Mx: {Mx}, My: {My}, Mz: {Mz},\n"
-                    #      f" s0: {s0}, s1: {s1}, s2: {s2}, s3: {s3}, s4: {s4}, s5: {s5}, s6: {s6}, s7: {s7}")
-                    # print('\n')
+                    # Get timestamp
+                    timestamp = (time.monotonic() - start_time)
+                    # Get wrench (6 floats from offset 5 in one call)
+                    Fx, Fy, Fz, Mx, My, Mz = self.WRENCH_STRUCT.unpack_from(self._master.slaves[0].input, 5)
+
                     if datapoints > start_datapoint:
-                        writer.writerow({'Timestamp': timestamp,
-                            'Fx': Fx, 'Fy': Fy, 'Fz': Fz, 'Mx': Mx,'My': My, 'Mz': Mz,
-                            's0': s0, 's1': s1, 's2': s2, 's3': s3, 's4': s4, 's5': s5, 's6': s6, 's7': s7
-                         })
+                        sensone_writer.writerow([timestamp, Fx, Fy, Fz, Mx, My, Mz])
+
+                    # Keep the cycle period without accumulating the loop time
+                    next_cycle += self.time_step
+                    time.sleep(max(0.0, next_cycle - time.monotonic()))
+                    if datapoints % 100 == 0:
+                        print(f"Saved {datapoints} SensONE and {reader.n_samples} sensor datapoints")
 
-                    csvfile.flush()
-                    time.sleep(self.time_step)
-                    print(f"Saved {datapoints} datapoints")
+                if reader.error is not None:
+                    raise reader.error
 
             except KeyboardInterrupt:
                 # ctrl-C abort handling
                 print('Stopped.')
             finally:
-                csvfile.close()
-                print('The csv file is closed.')
+                reader.stop()
+                reader.join()
+                st = reader.stats()
+                print(f"Sensor: {st['samples']} samples at {st['rate_hz']:.1f} Hz, "
+                      f"{st['parse_errors']} parse errors, {st['dropped']} dropped")
+                print(reader.overload.report())
+                sensone_csvfile.close()
+                sensor_csvfile.close()
+                print('The csv files are closed.')
 
             self._master.state = pysoem.INIT_STATE
             # request INIT state for all slaves
@@ -196,15 +184,19 @@ if __name__ == '__main__':
 
     print('get_data')
 
-    # Open CSV file once at the start
-    filename = 'data.csv'
-    csvfile = open(filename, 'a', newline='')
-    fieldnames = ['Timestamp', 'Fx', 'Fy', 'Fz', 'Mx', 'My', 'Mz', 's0', 's1', 's2', 's3', 's4', 's5', 's6', 's7']
-    writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-
+    # Open CSV files once at the start, one per device
+    sensone_filename = 'data_sensONE.csv'
+    sensone_csvfile = open(sensone_filename, 'a', newline='')
+    sensone_writer = csv.writer(sensone_csvfile)
     # Write header only if file is empty
-    if os.path.getsize(filename) == 0:
-        writer.writeheader()
+    if os.path.getsize(sensone_filename) == 0:
+        sensone_writer.writerow(['Timestamp', 'Fx', 'Fy', 'Fz', 'Mx', 'My', 'Mz'])
+
+    sensor_filename = 'data_sensor.csv'
+    sensor_csvfile = open(sensor_filename, 'a', newline='')
+    sensor_writer = csv.writer(sensor_csvfile)
+    if os.path.getsize(sensor_filename) == 0:
+        sensor_writer.writerow(['Timestamp', 'seq_number', 's0', 's1', 's2', 's3', 's4', 's5', 's6', 's7'])
 
     try:
         MinimalExample().run()
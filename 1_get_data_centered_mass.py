@@ -9,9 +9,17 @@ and the wrench is estimated for the centered mass.
 The user has to introduce the direction of gravity (+x / -x / +y / -y / +z / -z)
 or what is the same, the direction in which the force is being applied.
 
+The samples with any raw value out of the overload bounds are not saved, and the percentage of
+overloaded samples of each channel is printed at the end (and written in overload_stats.csv for each pose).
+
+Only the samples where the raw values are steady are saved (see fts_steady_state.py),
+until 2000 steady samples are collected.
+
 The results are stored in a csv file, each row containing the next values:
 < Timestamp, Fx, Fy, Fz, Mx, My, Mz, s0, s1, s2, s3, s4, s5, s6, s7 >
 
+and a summary of its raw values is written next to it (data_x.summary.json, see fts_summary.py).
+
 """
 import math
 import sys
@@ -28,6 +36,13 @@ import os
 
 import serial
 
+from fts_profiling import Profiler
+from fts_serial import OverloadCounter
+from fts_steady_state import SteadyStateDetector
+from fts_summary import write_summary
+
+profiler = Profiler.from_argv()  # --profile option (see fts_profiling.py)
+
 print('Starting get_data.')
 
 # Function to get the direction from the user
@@ -63,10 +78,10 @@ try:
     baudrate = 115200
     ser = serial.Serial(port, baudrate, parity=serial.PARITY_NONE)
     print("Got the serial port.")
+    profiler.lap('open port')
 
     n_sensors = 8
-    overload_lower = 50
-    overload_upper = 950
+    overload = OverloadCounter(n_sensors)  # overload bounds: 50 to 950
 
     # Get wrench
     m = 0.93  # kg
@@ -88,15 +103,21 @@ try:
     if os.path.getsize(filename) == 0:
         writer.writeheader()
 
+    # Only steady samples are saved (the first ones while the mass is still swinging are discarded),
+    # and the capture stops as soon as enough of them are collected
+    detector = SteadyStateDetector(n_sensors)
     datapoints = 0
-    start_datapoint = 10
-    total_datapoints = 2000 + start_datapoint
+    total_datapoints = 2000
+    max_duration = 60  # seconds
     time_step = 1 / 200
     start_time = time.time()
 
+    profiler.lap('setup')
     #while True:
     while datapoints < total_datapoints:
-        datapoints += 1
+        if time.time() - start_time > max_duration:
+            print(f"Sensor not steady: only {datapoints} steady datapoints after {max_duration} s")
+            break
 
         # Get timestamp
         timestamp = (time.time() - start_time)
@@ -113,11 +134,10 @@ try:
             print("could not parse message/data:", data)
             continue
 
+        # Overloaded samples (any channel out of bounds) are not saved
         s = [s0, s1, s2, s3, s4, s5, s6, s7]
-        for i in range(n_sensors):
-            if (s[i] < overload_lower) or (s[i] > overload_upper):
-                print(f"Force overload channel {i}")
-                continue
+        if not overload.check(s):
+            continue
 
         # Print line
         # print('\n')
@@ -125,7 +145,8 @@ try:
         #      f" s0: {s0}, s1: {s1}, s2: {s2}, s3: {s3}, s4: {s4}, s5: {s5}, s6: {s6}, s7: {s7}")
         # print('\n')
 
-        if datapoints > start_datapoint:
+        if detector.update(s):
+            datapoints += 1
             writer.writerow({'Timestamp': timestamp,
                 'Fx': Fx, 'Fy': Fy, 'Fz': Fz, 'Mx': Mx,'My': My, 'Mz': Mz,
                 's0': s0, 's1': s1, 's2': s2, 's3': s3, 's4': s4, 's5': s5, 's6': s6, 's7': s7
@@ -140,9 +161,14 @@ except KeyboardInterrupt:
     print('Stopped.')
 except Exception as exp:
     print("Exception. Something went wrong.")
+    profiler.exception()
     sys.exit(1)
 finally:
+    profiler.lap('capture')
     csvfile.close()
     print('The csv file is closed.')
+    print(overload.report())
+    overload.save(os.path.join(os.path.dirname(filename), 'overload_stats.csv'), os.path.basename(filename))
+    write_summary(filename)  # summary sidecar of the raw values (see fts_summary.py)
 
 
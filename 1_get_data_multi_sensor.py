@@ -0,0 +1,101 @@
+"""
+
+This file collects raw data from several 3D printed sensors at the same time, one serial port each.
+
+Every port is read in its own thread, and all samples are stamped with the same monotonic clock,
+so the timestamps of the different sensors are aligned and can be compared directly.
+
+The results are stored in one csv file per sensor, each row containing the next values:
+< Timestamp, seq_number, s0, s1, s2, s3, s4, s5, s6, s7 >
+
+and a summary of the raw values of each file is written next to it (see fts_summary.py).
+
+The samples with any raw value out of the overload bounds are not saved.
+
+At the end, the throughput, the dropped samples (gaps in seq_number) and the overloaded samples
+of each port are printed.
+
+"""
+import csv
+import os
+import sys
+import time
+
+from fts_profiling import Profiler
+from fts_serial import SensorReader
+from fts_summary import write_summary
+
+print('Starting get_data.')
+
+# Serial ports of the sensors and output directory
+ports = ['COM3', 'COM4']
+baudrate = 115200
+directory = 'Datasets/multi_sensor'
+duration = 10.0  # seconds (None = until ctrl-C)
+
+fieldnames = ['Timestamp', 'seq_number', 's0', 's1', 's2', 's3', 's4', 's5', 's6', 's7']
+
+# Function to create the callback writing the samples of one sensor in its csv file
+def make_writer(writer):
+    def on_sample(timestamp, seq_number, s):
+        writer.writerow([timestamp, seq_number, *s])
+    return on_sample
+
+profiler = Profiler.from_argv()  # --profile option (see fts_profiling.py)
+
+filenames = []
+csvfiles = []
+readers = []
+try:
+    os.makedirs(directory, exist_ok=True)
+
+    # Start one reader per port with the same clock origin
+    t0 = time.monotonic()
+    for port in ports:
+        filename = os.path.join(directory, f"data_{port.replace('/', '_')}.csv")
+        csvfile = open(filename, 'a', newline='')
+        filenames.append(filename)
+        csvfiles.append(csvfile)
+        writer = csv.writer(csvfile)
+        # Write header only if file is empty
+        if os.path.getsize(filename) == 0:
+            writer.writerow(fieldnames)
+        readers.append(SensorReader(port, make_writer(writer), t0=t0, baudrate=baudrate))
+    for reader in readers:
+        reader.start()
+    print(f"Reading {len(readers)} ports: {', '.join(ports)}")
+    profiler.lap('start readers')
+
+    # Print progress until the duration is reached (or all readers failed)
+    while (duration is None or time.monotonic() - t0 < duration) and any(r.is_alive() for r in readers):
+        time.sleep(1.0)
+        print(', '.join(f"{r.port}: {r.n_samples}" for r in readers))
+
+except KeyboardInterrupt:
+    # ctrl-C abort handling
+    print('Stopped.')
+except Exception as exp:
+    print("Exception. Something went wrong.")
+    profiler.exception()
+    sys.exit(1)
+finally:
+    for reader in readers:
+        reader.stop()
+    for reader in readers:
+        reader.join()
+    for csvfile in csvfiles:
+        csvfile.close()
+    for filename in filenames:
+        write_summary(filename)  # summary sidecar of the raw values (see fts_summary.py)
+    print('The csv files are closed.')
+    profiler.lap('capture')
+
+    # Per-port statistics
+    for reader in readers:
+        if reader.error is not None:
+            print(f"{reader.port}: failed ({reader.error})")
+            continue
+        st = reader.stats()
+        print(f"{st['port']}: {st['samples']} samples at {st['rate_hz']:.1f} Hz, "
+              f"{st['parse_errors']} parse errors, {st['dropped']} dropped ({st['dropped_pct']:.2f} %)")
+        print(reader.overload.report())
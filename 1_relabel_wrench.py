@@ -0,0 +1,98 @@
+"""
+
+This file recomputes the estimated wrench (Fx, Fy, Fz, Mx, My, Mz) of every pose file
+collected with "1_get_data_offcentered_mass.py", without having to collect the data again.
+
+The mass position and the RPY angles are read from each file name (data_{pos}_R{roll}_P{pitch}_Y{yaw}.csv),
+and the jig geometry (mass and COG position for each mass position, and gravity) is read from a JSON file
+(see jig_geometry.json). Note that the angles in the file names are rounded to 3 decimals.
+
+All rotation matrices are built at once, and the wrench in the sensor frame is computed as:
+F_s = R_ws^T * F_w and M_s = r x F_s (R_ws^T is the inverse of the rotation matrix), see fts_gravity.py.
+
+Finally, the wrench columns of each file are rewritten, keeping the timestamp and raw sensor values as they are.
+
+"""
+
+import numpy as np
+import glob
+import os
+import re
+import sys
+import time
+
+from fts_gravity import load_jig_geometry, pose_wrenches
+from fts_profiling import Profiler
+from fts_summary import read_summary, write_summary
+
+profiler = Profiler.from_argv()  # --profile option (see fts_profiling.py)
+
+# Directory containing the pose CSV files, and where to write the relabelled files (same directory = in place)
+directory = 'Datasets/12_final_extra_bounded/data'
+output_directory = directory
+jig_config = 'jig_geometry.json'
+
+# Pattern of the pose file names: mass position and RPY angles
+pose_pattern = re.compile(r'data_(?P<pos>-?[\d.]+)_R(?P<roll>-?[\d.]+)_P(?P<pitch>-?[\d.]+)_Y(?P<yaw>-?[\d.]+)\.csv$')
+
+expected_header = 'Timestamp,Fx,Fy,Fz,Mx,My,Mz,s0,s1,s2,s3,s4,s5,s6,s7'
+
+try:
+    start_time = time.perf_counter()
+
+    # Load jig geometry
+    g, positions = load_jig_geometry(jig_config)
+
+    # Read the pose of every file from its name
+    files, pos, rpy = [], [], []
+    for file in sorted(glob.glob(os.path.join(directory, 'data_*.csv'))):
+        match = pose_pattern.search(os.path.basename(file))
+        if match is None:
+            print(f"Warning: {file} does not follow the pose naming, skipped")
+            continue
+        if float(match['pos']) not in positions:
+            print(f"Warning: {file} has mass position {match['pos']} not in {jig_config}, skipped")
+            continue
+        files.append(file)
+        pos.append(float(match['pos']))
+        rpy.append([float(match['roll']), float(match['pitch']), float(match['yaw'])])
+    if not files:
+        print("No valid CSV files found.")
+        sys.exit(1)
+    rpy = np.array(rpy)
+    profiler.lap('parse file names')
+
+    # Compute all the wrenches at once
+    W = pose_wrenches(pos, rpy, g, positions)
+    profiler.lap('compute wrenches')
+    compute_time = time.perf_counter() - start_time
+
+    # Rewrite the wrench columns of every file (fields 1 to 6 of each row)
+    os.makedirs(output_directory, exist_ok=True)
+    for file, w in zip(files, W):
+        with open(file) as f:
+            lines = f.read().splitlines()
+        if not lines or lines[0] != expected_header:
+            print(f"Warning: {file} has incorrect header, skipped")
+            continue
+        wrench = ','.join(repr(float(x)) for x in w)
+        rows = [line.split(',', 7) for line in lines[1:] if line]
+        summary = read_summary(file)  # the raw values do not change, so the summary sidecar is kept
+        out_file = os.path.join(output_directory, os.path.basename(file))
+        with open(out_file, 'w', newline='') as f:
+            f.write(expected_header + '\n')
+            f.writelines(f"{row[0]},{wrench},{row[7]}\n" for row in rows if len(row) == 8)
+        if summary is not None:
+            write_summary(out_file, summary)
+
+    profiler.lap('rewrite files')
+    print(f"Relabelled {len(files)} pose files "
+          f"(wrench computation: {compute_time * 1000:.2f} ms, total: {time.perf_counter() - start_time:.2f} s).")
+
+except KeyboardInterrupt:
+    # ctrl-C abort handling
+    print('Stopped.')
+except Exception as exp:
+    print("Exception. Something went wrong.")
+    profiler.exception()
+    sys.exit(1)
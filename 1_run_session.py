@@ -0,0 +1,202 @@
+"""
+
+This file runs a whole calibration campaign in a single session: the poses of a pose plan
+are captured back to back, with the serial port of the 3D printed sensor kept open all the time.
+
+The pose plan is a csv file with one pose per row: < pos, roll, pitch, yaw >
+(mass position on the jig and RPY angles in radians, see Datasets/12_final_extra_bounded/pose_plan.csv).
+Keep the poses of the same mass position together, since the operator is asked to move the mass
+every time the position changes.
+
+For each pose, the robot is moved to the orientation (see fts_robot.py: by the operator, or simulated
+with --simulate), the wrench is computed from the jig geometry (see fts_gravity.py and jig_geometry.json),
+and the steady samples inside the overload bounds are written until enough of them are collected.
+
+All the poses go to the data folder of one dataset, with the same file names as the capture scripts
+(data_{pos}_R{roll}_P{pitch}_Y{yaw}.csv, angles rounded to 3 decimals), so 2_merge_data.py can be used directly.
+A summary of the raw values of each pose is written next to its file (see fts_summary.py).
+The completed poses are appended to session_progress.csv (and the overload stats to overload_stats.csv),
+and a new session with the same plan and dataset skips them, so an interrupted campaign can be resumed.
+
+Usage: python 1_run_session.py Datasets/12_final_extra_bounded/pose_plan.csv --dataset Datasets/13_session --port COM3
+
+"""
+
+import argparse
+import csv
+import os
+import sys
+import threading
+import time
+
+import pandas as pd
+
+from fts_gravity import load_jig_geometry, pose_wrenches
+from fts_profiling import Profiler
+from fts_robot import ManualRobot, SimulatedRobot
+from fts_serial import OverloadCounter, SensorReader, n_sensors
+from fts_steady_state import SteadyStateDetector
+from fts_summary import write_summary
+
+progress_fields = ['index', 'pos', 'roll', 'pitch', 'yaw', 'file', 'samples', 'overloaded_pct', 'duration_s']
+fieldnames = ['Timestamp', 'Fx', 'Fy', 'Fz', 'Mx', 'My', 'Mz', 's0', 's1', 's2', 's3', 's4', 's5', 's6', 's7']
+
+
+# Capture of one pose: called from the reader thread with every sample, until enough steady samples are written
+class PoseCapture:
+
+    def __init__(self, writer, wrench, total_datapoints, t0):
+        self.writer = writer
+        self.wrench = list(wrench)
+        self.total_datapoints = total_datapoints
+        self.t0 = t0  # timestamps of each pose start at 0, as in the capture scripts
+        self.detector = SteadyStateDetector(n_sensors)
+        self.overload = OverloadCounter(n_sensors)
+        self.datapoints = 0
+        self.done = threading.Event()
+        self._lock = threading.Lock()
+
+    def on_sample(self, timestamp, seq_number, s):
+        with self._lock:
+            if self.done.is_set():
+                return
+            # Overloaded samples (any channel out of bounds) are not saved, nor the ones while the mass swings
+            if not self.overload.check(s):
+                return
+            if self.detector.update(s):
+                self.writer.writerow([timestamp - self.t0] + self.wrench + list(s))
+                self.datapoints += 1
+                if self.datapoints >= self.total_datapoints:
+                    self.done.set()
+
+    # Stop writing (the file can be closed after this)
+    def finish(self):
+        with self._lock:
+            self.done.set()
+
+
+# Function to read the plan indices already completed in a previous session
+def read_progress(progress_file):
+    if not os.path.exists(progress_file):
+        return set()
+    return set(pd.read_csv(progress_file)['index'])
+
+
+# Function to append a completed pose to the progress file
+def save_progress(progress_file, row):
+    write_header = not os.path.exists(progress_file) or os.path.getsize(progress_file) == 0
+    with open(progress_file, 'a', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=progress_fields)
+        if write_header:
+            writer.writeheader()
+        writer.writerow(row)
+
+
+def main():
+    profiler = Profiler.from_argv()  # --profile option (see fts_profiling.py)
+    parser = argparse.ArgumentParser(description='Capture all the poses of a pose plan in one session.')
+    parser.add_argument('plan', help='pose plan csv file (pos, roll, pitch, yaw)')
+    parser.add_argument('--dataset', required=True, help='dataset folder (the poses are written to <dataset>/data)')
+    parser.add_argument('--port', default='COM3')
+    parser.add_argument('--jig', default='jig_geometry.json', help='jig geometry file')
+    parser.add_argument('--samples', type=int, default=2000, help='steady samples per pose')
+    parser.add_argument('--max-duration', type=float, default=60, help='seconds per pose before giving up')
+    parser.add_argument('--simulate', action='store_true', help='use the simulated robot instead of the operator')
+    args = parser.parse_args()
+
+    reader = None
+    capture = None
+    session = {'capture': None}  # current pose capture, None between poses (samples are discarded)
+    try:
+        plan = pd.read_csv(args.plan)
+        g, positions = load_jig_geometry(args.jig)
+        data_dir = os.path.join(args.dataset, 'data')
+        os.makedirs(data_dir, exist_ok=True)
+        progress_file = os.path.join(args.dataset, 'session_progress.csv')
+        completed = read_progress(progress_file)
+        pending = [i for i in range(len(plan)) if i not in completed]
+        print(f"Pose plan: {len(plan)} poses, {len(completed)} already completed, {len(pending)} to capture.")
+        if not pending:
+            return
+
+        robot = SimulatedRobot() if args.simulate else ManualRobot()
+
+        # The port stays open for the whole session
+        def on_sample(timestamp, seq_number, s):
+            current = session['capture']
+            if current is not None:
+                current.on_sample(timestamp, seq_number, s)
+
+        reader = SensorReader(args.port, on_sample, reject_overload=False)
+        reader.start()
+        print("Got the serial port.")
+        profiler.lap('setup')
+
+        session_start = time.perf_counter()
+        current_pos = None
+        n_captured = 0
+        for i in pending:
+            pos = float(plan['pos'][i])
+            if pos != current_pos:
+                robot.set_mass_position(pos)
+                current_pos = pos
+
+            # Orientation actually reached, rounded as in the file names (so that 1_relabel_wrench.py gives the same wrench)
+            roll, pitch, yaw = [round(x, 3) for x in robot.move_to(plan['roll'][i], plan['pitch'][i], plan['yaw'][i])]
+            wrench = pose_wrenches([pos], [[roll, pitch, yaw]], g, positions)[0]
+
+            filename = os.path.join(data_dir, f'data_{pos}_R{roll}_P{pitch}_Y{yaw}.csv')
+            pose_start = time.perf_counter()
+            with open(filename, 'w', newline='') as csvfile:  # an interrupted pose is captured again from scratch
+                writer = csv.writer(csvfile)
+                writer.writerow(fieldnames)
+                capture = PoseCapture(writer, wrench, args.samples, time.monotonic() - reader.t0)
+                session['capture'] = capture
+                while not capture.done.wait(0.5):
+                    if reader.error is not None:
+                        raise reader.error
+                    if time.perf_counter() - pose_start > args.max_duration:
+                        break
+                capture.finish()
+                session['capture'] = None
+            write_summary(filename)  # summary sidecar of the raw values (see fts_summary.py)
+            duration = time.perf_counter() - pose_start
+
+            print(f"[{i + 1}/{len(plan)}] {os.path.basename(filename)}: {capture.datapoints} datapoints in {duration:.1f} s")
+            capture.overload.save(os.path.join(args.dataset, 'overload_stats.csv'), os.path.basename(filename))
+            if capture.datapoints < args.samples:
+                # Not marked as completed, so it is captured again in the next session
+                print(f"Sensor not steady: only {capture.datapoints} steady datapoints after {args.max_duration} s")
+                continue
+            save_progress(progress_file, {
+                'index': i, 'pos': pos, 'roll': roll, 'pitch': pitch, 'yaw': yaw,
+                'file': os.path.basename(filename), 'samples': capture.datapoints,
+                'overloaded_pct': round(capture.overload.rejected_pct(), 3), 'duration_s': round(duration, 2),
+            })
+            n_captured += 1
+            profiler.lap(f'pose {i}')
+
+        print(f"Captured {n_captured} poses in {time.perf_counter() - session_start:.1f} s.")
+        remaining = len(plan) - len(read_progress(progress_file))
+        if remaining:
+            print(f"{remaining} poses left: run the session again to capture them.")
+
+    except KeyboardInterrupt:
+        # ctrl-C abort handling
+        print('Stopped. Run the session again to resume.')
+    except Exception as exp:
+        print("Exception. Something went wrong.")
+        profiler.exception()
+        sys.exit(1)
+    finally:
+        session['capture'] = None
+        if capture is not None:
+            capture.finish()
+        if reader is not None:
+            reader.stop()
+            reader.join()
+            print(reader.stats())
+
+
+if __name__ == '__main__':
+    main()
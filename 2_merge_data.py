@@ -1,72 +1,236 @@
 """
 
 This file reads all the collected data inside the same folder but in different CSV files,
-and it merges everything into a single CSV file.
+and it merges everything into a single dataset.
 
-It can be used to filter out (or not) datapoints out of the bounds for the raw sensor values.
+It can be used to filter out (or not) datapoints out of the bounds for the raw sensor values,
+and to trim the transients (datapoints where the raw sensor values are not steady, see fts_steady_state.py).
+A pose that would lose more than max_trimmed_pct of its rows to the trimming is not merged, and it is
+reported at the end (it is most likely a bad capture, to be checked or captured again).
+
+Each row keeps a compact integer pose_id pointing to the file (pose) it came from,
+and a pose table (pose_id, mass position, RPY, wrench, file) is saved as poses.csv in the dataset folder.
 
 Finally, it separates the dataset into training and validation data,
 using randomly chosen datapoints and separating into 80% and 20% respectively.
 
+The wrench is only stored once per pose, in the pose table (poses.csv). The samples are stored once,
+one binary file per column in the merged folder, and the training and validation data are stored
+as row indices (train_idx.npy and val_idx.npy), see fts_dataset.py.
+The merged data can also be written in a csv file (data.csv) for inspection.
+
+To keep the memory bounded, the files are read in chunks, parsed directly into compact types
+(uint16 sensor values, float64 wrench and timestamp), filtered, and appended into preallocated columns.
+The transients are trimmed across the chunk boundaries, so the result does not depend on the chunk size.
+A file that fails is rolled back (none of its rows are kept).
+The peak memory used (RSS) is printed at the end.
+
+The number of rows of each file (to preallocate) and how many are out of the bounds are taken from the
+summary sidecars of the files (see fts_summary.py), and the missing sidecars are written during the merge.
+
 """
 
 import pandas as pd
+import numpy as np
 import glob
 import os
+import re
+
+from fts_dataset import save_columns, save_split, column_dtypes
+from fts_profiling import Profiler, peak_rss_mb
+from fts_steady_state import steady_chunks
+from fts_summary import Summary, read_summary, write_summary
+
+profiler = Profiler.from_argv()  # --profile option (see fts_profiling.py)
+
+print(f"Peak RSS before merging: {peak_rss_mb()} MB")
 
 # Directory containing the CSV files (update if needed)
 directory = r"C:\Users\jonur\Workspace\MECAUT\SensONE\calibration\Datasets\12_final_extra_bounded\data"
 
-# Find all CSV files in the directory
-csv_files = glob.glob(os.path.join(directory, "*.csv"))
+# Find all pose CSV files in the directory (named data_{pos}_R{roll}_P{pitch}_Y{yaw}.csv)
+csv_files = sorted(glob.glob(os.path.join(directory, "data_*.csv")))
 
 # Expected header
 expected_columns = ['Timestamp', 'Fx', 'Fy', 'Fz', 'Mx', 'My', 'Mz', 's0', 's1', 's2', 's3', 's4', 's5', 's6', 's7']
+wrench_cols = ['Fx', 'Fy', 'Fz', 'Mx', 'My', 'Mz']
+sensor_cols = ['s0', 's1', 's2', 's3', 's4', 's5', 's6', 's7']
+read_dtypes = {'Timestamp': np.float64, **{c: np.float64 for c in wrench_cols}, **{c: np.uint16 for c in sensor_cols}}
+
+# Initialize the pose table
+poses = []
 
-# Initialize an empty list to store DataFrames
-dfs = []
+# Pattern of the pose file names: mass position and RPY angles
+pose_pattern = re.compile(r'data_(?P<pos>-?[\d.]+)_R(?P<roll>-?[\d.]+)_P(?P<pitch>-?[\d.]+)_Y(?P<yaw>-?[\d.]+)\.csv$')
 
 n_sensors = 8
 overload_lower = 50
 overload_upper = 950
+trim_transients = True
+max_trimmed_pct = 50  # poses losing more of their rows to the trimming are not merged
+write_csv = False
+chunksize = 500000  # rows read at once from each file
+
+# Function to count the rows of a file (upper bound of its datapoints) without parsing it
+def count_lines(file):
+    with open(file, 'rb') as f:
+        return sum(block.count(b'\n') for block in iter(lambda: f.read(1 << 20), b''))
+
+# Function to read a file in chunks with compact types
+# Each chunk is checked before the cast: the rows with invalid values (not numbers, or sensor values
+# out of the uint16 range) are dropped
+def read_chunks(file):
+    for chunk in pd.read_csv(file, chunksize=chunksize):
+        invalid = [col for col in read_dtypes if not pd.api.types.is_numeric_dtype(chunk[col])]
+        if invalid:
+            chunk[invalid] = chunk[invalid].apply(pd.to_numeric, errors='coerce')
+        values = chunk[wrench_cols + sensor_cols]
+        valid = values.notna().all(axis=1) & \
+            ((values[sensor_cols] >= 0) & (values[sensor_cols] <= np.iinfo(np.uint16).max)).all(axis=1)
+        if not valid.all():
+            print(f"Warning: {file} has invalid values, dropping {(~valid).sum()} rows")
+            chunk = chunk[valid]
+        yield chunk.astype(read_dtypes)
+
+# Function to pass the chunks of a file through, adding their raw values to the summary of the file (if any)
+def summarized(chunks, summary):
+    for chunk in chunks:
+        if summary is not None:
+            summary.update(chunk[sensor_cols].to_numpy())
+        yield chunk
+
+# Plan the merge from the summary sidecars of the files (see fts_summary.py): number of rows and rows out of
+# the bounds, without reading the raw rows. The files without an up-to-date sidecar are counted by lines,
+# and their sidecar is written while they are merged
+summaries = {file: read_summary(file) for file in csv_files}
+known = [s for s in summaries.values() if s is not None]
+if known:
+    planned = Summary.combine(known)
+    print(f"Sidecars of {len(known)} of {len(csv_files)} files: {planned.n_rows} rows, "
+          f"{planned.n_rows_out_of_bounds} with any value out of the bounds")
 
-# Read the first CSV with header, others without
+# Preallocate the output columns (upper bound: all the rows of all the files)
+capacity = sum(summaries[file].n_rows if summaries[file] is not None else count_lines(file) for file in csv_files)
+merged = {col: np.empty(capacity, dtype=dtype) for col, dtype in column_dtypes.items()}
+n_rows = 0
+skipped = []  # (file, reason) of the poses not merged
+profiler.lap('count rows')
+
+# Read the files one by one, in chunks, and append the valid rows
 for i, file in enumerate(csv_files):
+    start = n_rows
     try:
-        df = pd.read_csv(file, dtype_backend='numpy_nullable')
+        with open(file) as f:
+            header = f.readline().strip().split(',')
         # Verify header
-        if list(df.columns) != expected_columns:
-            print(f"Warning: {file} has incorrect columns: {df.columns}")
+        if header != expected_columns:
+            print(f"Warning: {file} has incorrect columns: {header}")
             continue
-        # Convert wrench and sensor columns to numeric, drop invalid rows
-        wrench_cols = ['Fx', 'Fy', 'Fz', 'Mx', 'My', 'Mz']
-        sensor_cols = ['s0', 's1', 's2', 's3', 's4', 's5', 's6', 's7']
-        df[wrench_cols + sensor_cols] = df[wrench_cols + sensor_cols].apply(pd.to_numeric, errors='coerce')
-        df = df.dropna(subset=wrench_cols + sensor_cols)
-
-        # Filter out rows where any sensor value is out of bounds
-        df = df[(df[sensor_cols] >= overload_lower).all(axis=1) & (df[sensor_cols] <= overload_upper).all(axis=1)]
-
-        # For first file, keep header; for others, skip it
-        if i > 0:
-            df = df.iloc[1:]  # Skip header for non-first files
-        dfs.append(df)
+
+        n_read = n_trimmed = 0
+        skip_first = i > 0
+        W = None
+        summary = Summary() if summaries[file] is None else None
+        # Blocks of rows, with the rows covered by a steady window of the raw sensor values (over the whole file)
+        chunks = summarized(read_chunks(file), summary)
+        blocks = steady_chunks(chunks, sensor_cols) if trim_transients else ((df, None) for df in chunks)
+        for df, steady in blocks:
+            S = df[sensor_cols].to_numpy()
+            keep = np.ones(len(df), dtype=bool)
+            n_read += len(df)
+
+            # Trim transients
+            if steady is not None:
+                n_trimmed += int((~steady).sum())
+                keep &= steady
+
+            # Filter out rows where any sensor value is out of bounds
+            keep &= ((S >= overload_lower) & (S <= overload_upper)).all(axis=1)
+
+            # For first file, keep header; for others, skip it (the first row kept of the file)
+            if skip_first and keep.any():
+                keep[np.argmax(keep)] = False  # Skip header for non-first files
+                skip_first = False
+
+            # The wrench is the same for every row of the pose file
+            W_chunk = df[wrench_cols].to_numpy()[keep]
+            if len(W_chunk) > 0:
+                W = W_chunk[0] if W is None else W
+                if np.abs(W_chunk - W).max() > 1e-9:
+                    print(f"Warning: {file} has a different wrench in some rows, the first one is kept in poses.csv")
+
+            # Append the rows into the preallocated columns
+            n = int(keep.sum())
+            merged['Timestamp'][n_rows:n_rows + n] = df['Timestamp'].to_numpy()[keep]
+            for c, col in enumerate(sensor_cols):
+                merged[col][n_rows:n_rows + n] = S[keep, c]
+            n_rows += n
+
+        # Poses mostly trimmed are not merged (their rows are removed again)
+        if n_trimmed:
+            print(f"{os.path.basename(file)}: trimmed {n_trimmed} non-steady rows of {n_read}")
+        if n_trimmed > max_trimmed_pct / 100 * n_read:
+            reason = f"{100 * n_trimmed / max(n_read, 1):.1f} % of the rows are not steady"
+            print(f"WARNING: {file} is not merged: {reason}")
+            skipped.append((os.path.basename(file), reason))
+            n_rows = start
+            if summary is not None:
+                write_summary(file, summary)
+            continue
+
+        # Tag rows with the pose they come from
+        match = pose_pattern.search(os.path.basename(file))
+        if match is None:
+            print(f"Warning: {file} does not follow the pose naming, pose values left empty")
+        pose_id = len(poses)
+        merged['pose_id'][start:n_rows] = pose_id
+        poses.append({'pose_id': pose_id,
+                      'pos': float(match['pos']) if match else np.nan,
+                      'roll': float(match['roll']) if match else np.nan,
+                      'pitch': float(match['pitch']) if match else np.nan,
+                      'yaw': float(match['yaw']) if match else np.nan,
+                      **dict(zip(wrench_cols, W if W is not None else [np.nan] * 6)),
+                      'file': os.path.basename(file),
+                      'n_rows': n_rows - start})
+        if summary is not None:
+            write_summary(file, summary)
     except Exception as e:
+        # Roll back the rows of the file already appended
+        n_rows = start
         print(f"Error processing {file}: {e}")
+        profiler.exception()
+profiler.lap('read files')
+if skipped:
+    print(f"\nWARNING: {len(skipped)} poses were not merged:")
+    for name, reason in skipped:
+        print(f"    {name}: {reason}")
 
-# Concatenate valid DataFrames
-if dfs:
-    merged_df = pd.concat(dfs, ignore_index=True)
+# Save the valid rows
+if poses:
+    merged = {col: values[:n_rows] for col, values in merged.items()}
+    poses_df = pd.DataFrame(poses)
+    dataset = os.path.join(directory, '..')
     # Save merged data
-    merged_df.to_csv(os.path.join(directory, 'data.csv'), index=False)
-    print(f"Merged {len(dfs)} files into 'data.csv' with {len(merged_df)} rows.")
-    # Split data into train (80%) and validation (20%)
-    train_df = merged_df.sample(frac=0.8, random_state=42)
-    val_df = merged_df.drop(train_df.index)
-    # Save split datasets
-    train_df.to_csv(os.path.join(directory, '../train/train_data.csv'), index=False)
-    val_df.to_csv(os.path.join(directory, '../val/val_data.csv'), index=False)
-    print(f"Split into train_data.csv ({len(train_df)} rows) and val_data.csv ({len(val_df)} rows).")
+    save_columns(dataset, merged)
+    print(f"Merged {len(poses)} files into the merged folder with {n_rows} rows.")
+    profiler.lap('save columns')
+    if write_csv:
+        merged_df = pd.DataFrame(merged)
+        merged_df[wrench_cols] = poses_df.set_index('pose_id').loc[merged['pose_id'], wrench_cols].to_numpy()
+        merged_df[expected_columns + ['pose_id']].to_csv(os.path.join(directory, 'data.csv'), index=False)
+        print("Saved the merged data in 'data.csv'.")
+    # Save pose table (lookup for the pose_id column)
+    poses_df.to_csv(os.path.join(dataset, 'poses.csv'), index=False)
+    print(f"Saved pose table poses.csv with {len(poses)} poses.")
+    # Split data into train (80%) and validation (20%), saved as row indices
+    train_idx = pd.RangeIndex(n_rows).to_series().sample(frac=0.8, random_state=42).to_numpy()
+    val_idx = np.setdiff1d(np.arange(n_rows), train_idx)
+    save_split(dataset, 'train', train_idx)
+    save_split(dataset, 'val', val_idx)
+    profiler.lap('save poses and split')
+    print(f"Split into train_idx.npy ({len(train_idx)} rows) and val_idx.npy ({len(val_idx)} rows).")
 
 else:
-    print("No valid CSV files found.")
\ No newline at end of file
+    print("No valid CSV files found.")
+
+print(f"Peak RSS after merging: {peak_rss_mb()} MB")
@@ -12,8 +12,13 @@ import matplotlib.pyplot as plt
 import matplotlib.cm as cm
 import numpy as np
 
+from fts_profiling import Profiler
+
+profiler = Profiler.from_argv()  # --profile option (see fts_profiling.py)
+
 # Read the CSV file
 df = pd.read_csv(f'Datasets/8_final/data_0.0_R-1.572_P0.003_Y-1.564.csv')
+profiler.lap('read csv')
 
 # Convert Timestamp to relative time (seconds since start)
 df['Relative_Time'] = df['Timestamp'] - df['Timestamp'].min()
@@ -30,6 +35,7 @@ plt.grid(True)
 plt.tight_layout()
 plt.savefig(f'Plots/forces_plot.png')
 plt.close()
+profiler.lap('plot forces')
 
 # Plot 2: Moments (Mx, My, Mz) vs Time
 plt.figure(figsize=(10, 6))
@@ -43,6 +49,7 @@ plt.grid(True)
 plt.tight_layout()
 plt.savefig(f'Plots/moments_plot.png')
 plt.close()
+profiler.lap('plot moments')
 
 # Plot 3: Sensor Values (s0-s3 and s4-s7) vs Time (Scatter Plot with Subplots)
 fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(10, 8), sharex=True)
@@ -65,4 +72,5 @@ ax2.grid(True)
 
 plt.tight_layout()
 plt.savefig(f'Plots/sensor_values_plot.png')
-plt.close()
\ No newline at end of file
+plt.close()
+profiler.lap('plot sensor values')
\ No newline at end of file
@@ -1,16 +1,55 @@
 """
 
-This file reads a CSV file with collected data, takes the raw sensor values, sorts EACH of
+This file reads the collected data of a dataset, takes the raw sensor values, sorts EACH of
 (s0-s7) them from smaller to bigger, and finally plots it.
 
+The raw rows are not sorted: the raw values are integers from 0 to 1023, so their exact counts
+(histograms, see fts_summary.py) are built in one streaming pass, and the sorted values are read from them.
+The data can be taken from:
+- 'merged' (default): the merged samples of the dataset (merged folder, see fts_dataset.py), read in blocks
+  of rows. These are the samples kept by 2_merge_data.py (inside the overload bounds and steady),
+  the same as the merged data.csv.
+- 'sidecars': the summary sidecar of each capture file of the data folder (data_x.summary.json),
+  created the first time a file is used, and combined. These are all the raw samples of the capture files,
+  including the ones out of the bounds and the transients that the merge filters out.
+- a csv file (e.g. the merged data.csv), read in chunks.
+
+Each channel is plotted from a fixed number of quantiles (n_quantiles), so the cost of the plot
+does not grow with the number of rows.
+
 """
 
-import pandas as pd
+import glob
+
+import numpy as np
 import matplotlib.pyplot as plt
 
+from fts_profiling import Profiler
+from fts_summary import Summary, load_summary, summarize_file, summarize_merged
+
+profiler = Profiler.from_argv()  # --profile option (see fts_profiling.py)
+
 # Read data
 directory = 'Datasets/11_final_extra'
-df = pd.read_csv(f'{directory}/data/data.csv')
+# 'merged', 'sidecars' (raw capture files, unfiltered) or a csv file, e.g. f'{directory}/data/data.csv'
+source = 'merged'
+n_quantiles = 512  # points plotted per channel
+
+if source == 'sidecars':
+    files = sorted(glob.glob(f'{directory}/data/data_*.csv'))
+    summary = Summary.combine(load_summary(file) for file in files)
+    print(f"{len(files)} files", end=', ')
+elif source == 'merged':
+    summary = summarize_merged(directory)
+else:
+    summary = summarize_file(source)
+print(f"{summary.n_rows} rows ({summary.n_rows_out_of_bounds} with any value out of the bounds)")
+print(summary.table().to_string(index=False))
+profiler.lap('summarize')
+
+# Sorted values at n_quantiles evenly spaced indices (exact, from the counts)
+q = np.linspace(0, 1, n_quantiles)
+values = summary.quantiles(q)  # Shape: (8, n_quantiles)
 
 # Create subplots
 fig, axes = plt.subplots(2, 4, figsize=(15, 8), sharey=True)
@@ -18,15 +57,15 @@ axes = axes.flatten()
 
 # Plot each sensor value
 for i, sensor in enumerate(['s0', 's1', 's2', 's3', 's4', 's5', 's6', 's7']):
-    sorted_data = df[sensor].sort_values()
-    axes[i].plot(range(len(sorted_data)), sorted_data, 'b-')
+    axes[i].plot(q * (summary.count[i] - 1), values[i], 'b-')
     axes[i].set_title(f'{sensor}')
     axes[i].set_xlabel('Index')
     axes[i].set_ylabel('Sensor Value')
     axes[i].grid(True)
-    axes[i].axhline(y=50, color='k', linewidth=1, linestyle='--')
-    axes[i].axhline(y=950, color='k', linewidth=1, linestyle='--')
+    axes[i].axhline(y=summary.lower, color='k', linewidth=1, linestyle='--')
+    axes[i].axhline(y=summary.upper, color='k', linewidth=1, linestyle='--')
 
 plt.tight_layout()
 plt.savefig(f'{directory}/data/sensor_plots.png')
-plt.close()
\ No newline at end of file
+plt.close()
+profiler.lap('plot')
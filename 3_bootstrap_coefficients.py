@@ -0,0 +1,181 @@
+"""
+
+This file estimates how stable the calibration coefficients of 3_linearization*.py are, by bootstrapping
+the training data by pose: each replicate draws the poses with replacement and refits the model
+(same degree, estimator and alpha) from per-pose sufficient statistics (see fts_bootstrap.py).
+The replicates are run in parallel by a pool of processes.
+
+It writes in <dataset>/results/bootstrap/:
+- coef_ci_{estimator}{suffix}.csv: for every coefficient (C and each term, for each wrench value),
+  the estimate on all the data, the bootstrap std, the confidence interval (percentiles of the replicates),
+  and the percentage of replicates where the coefficient is exactly 0 (useful to tell if a Lasso zero is real).
+- prediction_bands_{estimator}{suffix}.csv: prediction interval of each wrench value, evaluated on the
+  validation data: mean and max half-width, and the percentage of validation samples inside the band.
+- prediction_bands_{estimator}{suffix}_poses.csv: the same band, averaged over the samples of each validation pose.
+
+With --weighting, the fit is a weighted least squares (e.g. 'pose': every pose counts the same, see sample_weights
+in fts_polynomial.py), and the suffix of the output files ends with _w{weighting}.
+
+The prediction interval combines the spread of the replicates at each sample (covariance of the coefficients
+in standardized terms) and the residual noise: prediction +- z * sqrt(var_bootstrap + var_residual).
+
+Usage: python 3_bootstrap_coefficients.py --dataset Datasets/12_final_extra_bounded --degree 2 --estimator lasso
+
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy.stats import norm
+
+from fts_bootstrap import PoseStatistics, resample_poses
+from fts_dataset import load_dataset
+from fts_polynomial import PolynomialModel, monomials, sample_weights, term_name, wrench_names
+from fts_profiling import Profiler
+
+stats = None  # per-pose statistics, sent once to each worker process
+beta0 = None  # fit on all the poses (warm start for Lasso)
+
+def init_worker(pose_stats, beta):
+    global stats, beta0
+    stats, beta0 = pose_stats, beta
+
+# Function to run the replicates with the given seeds, returns theta (k, terms + 1, 6), C (k, 6) and coef (k, 6, terms)
+def run_replicates(seeds, estimator, alpha):
+    results = [stats.fit(resample_poses(len(stats.poses), np.random.default_rng(seed)), estimator, alpha, beta0)
+               for seed in seeds]
+    return tuple(np.stack(r) for r in zip(*results))
+
+
+def main():
+    profiler = Profiler.from_argv()  # --profile option (see fts_profiling.py)
+    parser = argparse.ArgumentParser(description='Bootstrap confidence intervals of the calibration coefficients.')
+    parser.add_argument('--dataset', default='Datasets/12_final_extra_bounded')
+    parser.add_argument('--degree', type=int, default=2)
+    parser.add_argument('--estimator', default='lasso', choices=['linearregression', 'ridge', 'lasso'])
+    parser.add_argument('--alpha', type=float, default=1e-3, help='Ridge / Lasso penalty, on the standardized terms')
+    parser.add_argument('--weighting', default=None, choices=['pose', 'inverse_variance'],
+                        help='per-sample weights of the fit (default: none)')
+    parser.add_argument('--replicates', type=int, default=200)
+    parser.add_argument('--confidence', type=float, default=95, help='confidence level (%%)')
+    parser.add_argument('--workers', type=int, default=None, help='number of processes (default: number of CPUs)')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    try:
+        suffix = {1: '', 2: '_quadratic', 3: '_cubic'}.get(args.degree, f'_degree{args.degree}')
+        if args.weighting:
+            suffix += f'_w{args.weighting}'
+        out_dir = os.path.join(args.dataset, 'results', 'bootstrap')
+        os.makedirs(out_dir, exist_ok=True)
+
+        # Sufficient statistics of each training pose (the only pass over the raw rows)
+        start_time = time.perf_counter()
+        S, W, pose_id = load_dataset(args.dataset, 'train')
+        pose_stats = PoseStatistics(S, W, pose_id, args.degree, weights=sample_weights(S, pose_id, args.weighting))
+        n_poses = len(pose_stats.poses)
+        weights = np.ones(n_poses)
+        theta, C, coef = pose_stats.fit(weights, args.estimator, args.alpha)
+        residual_std = np.sqrt(pose_stats.residual_variance(theta, weights))
+        print(f"Statistics of {n_poses} poses ({len(S)} datapoints): {time.perf_counter() - start_time:.2f} s")
+        del S, W, pose_id
+        profiler.lap('pose statistics')
+
+        # Replicates, in chunks spread over the worker processes
+        start_time = time.perf_counter()
+        seeds = np.random.SeedSequence(args.seed).spawn(args.replicates)
+        n_chunks = min(args.replicates, 4 * (args.workers or os.cpu_count() or 1))
+        chunks = [list(c) for c in np.array_split(np.array(seeds, dtype=object), n_chunks)]
+        with ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker,
+                                 initargs=(pose_stats, theta[1:])) as pool:
+            results = list(pool.map(run_replicates, chunks, [args.estimator] * n_chunks, [args.alpha] * n_chunks))
+        thetas, Cs, coefs = (np.concatenate(r) for r in zip(*results))
+        profiler.lap('replicates')
+        print(f"{args.replicates} replicates: {time.perf_counter() - start_time:.2f} s")
+
+        # Confidence intervals of the raw coefficients (C and all the terms)
+        q = (100 - args.confidence) / 2
+        names = ['C'] + [term_name(t) for block in monomials(args.degree) for t in block]
+        estimate = np.column_stack([C, coef])  # Shape: (6, terms + 1)
+        replicates = np.concatenate([Cs[:, :, None], coefs], axis=2)  # Shape: (replicates, 6, terms + 1)
+        lower, upper = np.percentile(replicates, [q, 100 - q], axis=0)
+        ci = pd.DataFrame({
+            'Wrench': np.repeat(wrench_names, len(names)),
+            'term': np.tile(names, len(wrench_names)),
+            'estimate': estimate.ravel(),
+            'std': replicates.std(axis=0).ravel(),
+            'lower': lower.ravel(),
+            'upper': upper.ravel(),
+            'zero_pct': 100.0 * (replicates == 0).mean(axis=0).ravel(),
+        })
+        ci_file = os.path.join(out_dir, f'coef_ci_{args.estimator}{suffix}.csv')
+        ci.to_csv(ci_file, index=False)
+        excludes_zero = (ci['lower'] > 0) | (ci['upper'] < 0)
+        print(f"Coefficients whose {args.confidence:g}% interval excludes 0: {excludes_zero.sum()} of {len(ci)}")
+        if args.estimator == 'lasso':
+            always_zero = ci['zero_pct'] == 100
+            print(f"Lasso zeros: {(ci['estimate'] == 0).sum()} on all the data, {always_zero.sum()} in every replicate")
+        profiler.lap('confidence intervals')
+
+        # Prediction interval bands on the validation data
+        S_val, W_val, pose_val = load_dataset(args.dataset, 'val')
+        model = PolynomialModel(C, coef, args.degree)
+        z = norm.ppf(0.5 + args.confidence / 200)
+        cov = np.stack([np.cov(thetas[:, :, k], rowvar=False) for k in range(len(wrench_names))])
+        prediction = np.empty_like(W_val)
+        half_width = np.empty_like(W_val)
+        chunk_size = 100000
+        for a in range(0, len(S_val), chunk_size):
+            A = pose_stats.design(S_val[a:a + chunk_size])
+            var_bootstrap = np.einsum('np,kpq,nq->nk', A, cov, A, optimize=True)
+            prediction[a:a + chunk_size] = model.predict(S_val[a:a + chunk_size])
+            half_width[a:a + chunk_size] = z * np.sqrt(var_bootstrap + residual_std ** 2)
+        inside = np.abs(W_val - prediction) <= half_width
+
+        bands = pd.DataFrame({
+            'Wrench': wrench_names,
+            'residual_std': residual_std,
+            'mean_half_width': half_width.mean(axis=0),
+            'max_half_width': half_width.max(axis=0),
+            'coverage_pct': 100.0 * inside.mean(axis=0),
+        })
+        bands.to_csv(os.path.join(out_dir, f'prediction_bands_{args.estimator}{suffix}.csv'), index=False)
+
+        # Band of each validation pose (averaged over its samples)
+        if pose_val is not None:
+            poses, index = np.unique(pose_val, return_inverse=True)
+            counts = np.bincount(index)
+            per_pose = lambda x: np.column_stack([np.bincount(index, x[:, k]) for k in range(x.shape[1])]) / counts[:, None]
+            mean_W, mean_prediction, mean_half_width = per_pose(W_val), per_pose(prediction), per_pose(half_width)
+            pose_bands = pd.DataFrame({
+                'pose_id': np.repeat(poses, len(wrench_names)),
+                'Wrench': np.tile(wrench_names, len(poses)),
+                'W': mean_W.ravel(),
+                'prediction': mean_prediction.ravel(),
+                'lower': (mean_prediction - mean_half_width).ravel(),
+                'upper': (mean_prediction + mean_half_width).ravel(),
+                'coverage_pct': 100.0 * per_pose(inside.astype(float)).ravel(),
+            })
+            pose_bands.to_csv(os.path.join(out_dir, f'prediction_bands_{args.estimator}{suffix}_poses.csv'), index=False)
+
+        profiler.lap('prediction bands')
+        print(f"\nPrediction interval ({args.confidence:g}%) on the validation data:")
+        print(bands.to_string(index=False))
+        print(f"\nResults saved in {out_dir}")
+
+    except KeyboardInterrupt:
+        # ctrl-C abort handling
+        print('Stopped.')
+    except Exception as exp:
+        print("Exception. Something went wrong.")
+        profiler.exception()
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
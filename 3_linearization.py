@@ -1,44 +1,62 @@
 """
 
-This file reads the CSV file with collected data (the merged one), and then
+This file reads the training data (the merged one, see fts_dataset.py), and then
 solves the linear coefficients C and L (not Q) using the OLS method.
 
 It can be easily changed from Linear Regression, to Ridge or Lasso.
+The stability of the coefficients (e.g. whether the Lasso zeros are real) can be checked with 3_bootstrap_coefficients.py.
+
+The sensor values are standardized internally before solving, and the coefficients are folded back
+to the raw values (see fts_polynomial.py). The fit is cached by a hash of the training data and the settings,
+and the hash is saved in the params file (see fts_fit_cache.py).
+The samples can be weighted (e.g. so that every pose counts the same), see weighting.
 
 """
 
 import pandas as pd
 import numpy as np
-from sklearn.linear_model import LinearRegression, Ridge, Lasso
-from sklearn.model_selection import GridSearchCV
 import joblib
 
+from fts_dataset import load_dataset
+from fts_fit_cache import fit_polynomial_cached
+from fts_polynomial import sample_weights
+from fts_profiling import Profiler
+
+profiler = Profiler.from_argv()  # --profile option (see fts_profiling.py)
+
 # Load the dataset
 directory = 'Datasets/12_final_extra_bounded'
-df = pd.read_csv(f'{directory}/train/train_data.csv')
 
 # Features (sensor values, S: 8x1) and targets (wrench values, W: 6x1)
-S = df[['s0', 's1', 's2', 's3', 's4', 's5', 's6', 's7']].values  # Shape: (12000, 8)
-W = df[['Fx', 'Fy', 'Fz', 'Mx', 'My', 'Mz']].values  # Shape: (12000, 6)
+S, W, pose_id = load_dataset(directory, 'train')  # Shapes: (datapoints, 8) and (datapoints, 6)
+profiler.lap('load dataset')
 
 # Fit linear regression model: W = C + LS
-# model = LinearRegression()
-# model = Ridge()  # Tune alpha
-model = Lasso()  # Tune alpha
-model.fit(S, W)
+# estimator = 'linearregression'
+# estimator = 'ridge'  # Tune alpha
+estimator = 'lasso'  # Tune alpha
+alpha = 1e-3  # on the standardized sensor values
+# Weighted least squares: None, 'pose' (every pose counts the same, however many of its rows were filtered out)
+# or 'inverse_variance' (noisy poses count less), see sample_weights in fts_polynomial.py
+weighting = None
+weights = sample_weights(S, pose_id, weighting)
+# The fit is skipped if the same data and settings were already fitted (see fts_fit_cache.py)
+model, info = fit_polynomial_cached(S, W, 1, estimator, alpha, cache_dir=f'{directory}/results/fit_cache',
+                                    weights=weights)
+profiler.lap('fit')
+if info['cached']:
+    print(f"Same data and settings as a previous fit: params loaded from the fit cache ({info['fit_hash']})")
+else:
+    print(f"Fit time: {info['fit_time']:.3f} s (fit hash: {info['fit_hash']})")
+print(f"Condition number: {info['cond_raw']:.3e} (raw), {info['cond_standardized']:.3e} (standardized)")
 
 # Extract L (6x8 matrix) and C (6x1 vector)
-L = model.coef_  # Shape: (6, 8)
-C = model.intercept_  # Shape: (6,)
+L = model.coef  # Shape: (6, 8)
+C = model.C  # Shape: (6,)
 
 # Save L and C to a CSV file
-results = pd.DataFrame({
-    'Wrench': ['Fx', 'Fy', 'Fz', 'Mx', 'My', 'Mz'],
-    'C': C,
-    'L_s0': L[:, 0], 'L_s1': L[:, 1], 'L_s2': L[:, 2], 'L_s3': L[:, 3],
-    'L_s4': L[:, 4], 'L_s5': L[:, 5], 'L_s6': L[:, 6], 'L_s7': L[:, 7]
-})
-results.to_csv(f'{directory}/results/params/params_lasso.csv', index=False)
+model.to_csv(f'{directory}/results/params/params_lasso.csv')
+profiler.lap('save params')
 
 # Print results
 print("Bias Vector C (6x1):")
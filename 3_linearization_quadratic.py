@@ -1,59 +1,82 @@
 """
 
-Similarly to "3_linearization.py", this file reads the CSV file with collected data (the merged one),
+Similarly to "3_linearization.py", this file reads the training data (the merged one),
 and then solves the linear and quadratic coefficients C, L and Q using the OLS method.
 
+The degree of the polynomial can be increased (cubic terms and higher, see fts_polynomial.py),
+and then the params file also includes the higher order terms.
+
 It can be easily changed from Linear Regression, to Ridge or Lasso.
+The stability of the coefficients (e.g. whether the Lasso zeros are real) can be checked with 3_bootstrap_coefficients.py.
+
+The raw sensor values are standardized internally before solving (the quadratic terms of the
+raw values reach ~10^6 and make the problem ill-conditioned), and the coefficients are folded back
+to the raw values, so the params file has the same form. The fit time and the condition numbers are printed.
+
+The fit is cached by a hash of the training data, the degree and the estimator settings: running it again
+without changes loads the params from <dataset>/results/fit_cache, and the hash is saved in the params file (fit_hash).
+
+The fit can be weighted (weighted least squares): 2_merge_data.py filters out different numbers of rows
+of each pose, and with weighting = 'pose' every pose counts the same in the fit (see sample_weights).
 
 """
 
 import pandas as pd
 import numpy as np
-from sklearn.linear_model import LinearRegression, Ridge, Lasso
-from sklearn.preprocessing import PolynomialFeatures
-from sklearn.pipeline import make_pipeline
 import joblib
 
+from fts_dataset import load_dataset
+from fts_fit_cache import fit_polynomial_cached
+from fts_polynomial import sample_weights
+from fts_profiling import Profiler
+
+profiler = Profiler.from_argv()  # --profile option (see fts_profiling.py)
+
 # Load dataset
 directory = 'Datasets/12_final_extra_bounded'
-df = pd.read_csv(f'{directory}/train/train_data.csv')
 # Features (S: 8x1) and targets (W: 6x1)
-S = df[['s0', 's1', 's2', 's3', 's4', 's5', 's6', 's7']].values  # Shape: (datapoints, 8)
-W = df[['Fx', 'Fy', 'Fz', 'Mx', 'My', 'Mz']].values  # Shape: (datapoints, 6)
+S, W, pose_id = load_dataset(directory, 'train')  # Shapes: (datapoints, 8) and (datapoints, 6)
+profiler.lap('load dataset')
+
+# Polynomial terms: linear + quadratic (+ cubic...)
+degree = 2
+suffix = {2: '_quadratic', 3: '_cubic'}.get(degree, f'_degree{degree}')
 
-# Create pipeline with quadratic terms
-poly = PolynomialFeatures(degree=2, include_bias=False)  # Linear + quadratic terms
 estimator = 'lasso' #estimator = 'ridge' #estimator = 'linearregression'
-if estimator == 'linearregression':
-    model = make_pipeline(poly, LinearRegression())
-elif estimator == 'ridge':
-    model = make_pipeline(poly, Ridge())
-elif estimator == 'lasso':
-    model = make_pipeline(poly, Lasso())
+alpha = 1e-3  # Ridge / Lasso penalty, on the standardized terms
+# Weighted least squares: None, 'pose' (every pose counts the same, however many of its rows were filtered out)
+# or 'inverse_variance' (noisy poses count less), see sample_weights in fts_polynomial.py
+weighting = None
+weights = sample_weights(S, pose_id, weighting)
+# Fit with standardized terms (Cholesky / QR for OLS and Ridge), coefficients folded back to raw sensor values
+# The fit is skipped if the same data and settings were already fitted (see fts_fit_cache.py)
+calibration, info = fit_polynomial_cached(S, W, degree, estimator, alpha, cache_dir=f'{directory}/results/fit_cache',
+                                          weights=weights)
+profiler.lap('fit')
+if info['cached']:
+    print(f"Same data and settings as a previous fit: params loaded from the fit cache ({info['fit_hash']})")
 else:
-    print('Invalid estimator')
-model.fit(S, W)
+    print(f"Fit time: {info['fit_time']:.3f} s (fit hash: {info['fit_hash']})")
+print(f"Condition number: {info['cond_raw']:.3e} (raw terms), {info['cond_standardized']:.3e} (standardized terms)")
 
 # Extract coefficients
-L = model.named_steps[estimator].coef_[:, :8]  # Linear terms (6x8)
-Q = model.named_steps[estimator].coef_[:, 8:]  # Quadratic terms (6x36 for 8 sensors)
-C = model.named_steps[estimator].intercept_  # Bias (6x1)
+C = calibration.C  # Bias (6x1)
+L = calibration.coef[:, :8]  # Linear terms (6x8)
+Q = calibration.coef[:, 8:44]  # Quadratic terms (6x36 for 8 sensors)
 
 # Save results
-results = pd.DataFrame({
-    'Wrench': ['Fx', 'Fy', 'Fz', 'Mx', 'My', 'Mz'],
-    'C': C,
-    **{f'L_s{i}': L[:, i] for i in range(8)},
-    **{f'Q_s{i}s{j}': Q[:, i*8 + j - i*(i+1)//2] for i in range(8) for j in range(i, 8)}  # Quadratic terms
-})
-results.to_csv(f'{directory}/results/params/params_{estimator}_quadratic.csv', index=False)
+calibration.to_csv(f'{directory}/results/params/params_{estimator}{suffix}.csv')
+profiler.lap('save params')
 
 # Print results
 print("Bias Vector C (6x1):", C)
 print("\nLinear Matrix L (6x8):", L)
 print("\nQuadratic Coefficients Q (6x36):", Q)
+if degree > 2:
+    print(f"\nHigher order coefficients (6x{calibration.coef.shape[1] - 44}):", calibration.coef[:, 44:])
 
 # Evaluate
 from sklearn.metrics import r2_score
-W_pred = model.predict(S)
-print("\nR² Score:", r2_score(W, W_pred))
\ No newline at end of file
+W_pred = calibration.predict(S)
+print("\nR² Score:", r2_score(W, W_pred))
+profiler.lap('evaluate')
@@ -0,0 +1,149 @@
+"""
+
+This file evaluates several calibrated models (params_*.csv, see fts_polynomial.py) on several datasets,
+every pairing, to see how a calibration from one campaign holds up on another (generalization and drift).
+
+The pairings are split into tasks spread over a pool of processes: one task per dataset, or, when there are
+more processes than datasets, one task per dataset and group of params files. Each task loads its dataset
+(see fts_dataset.py, so a dataset is loaded once per group), and evaluates its models on it with the batched
+prediction, in blocks of rows.
+
+It writes in the output directory:
+- evaluation.csv: one row per dataset, params and wrench value: n, bias (mean error), MAE, RMSE, max error and R².
+- evaluation_matrix_<metric>.csv: one matrix per metric, with a row per params file and a column per dataset,
+  for the forces (F: Fx, Fy, Fz together, in N) and the moments (M: Mx, My, Mz together, in Nm).
+  The rows are labelled with the path of the params files relative to their common folder
+  (e.g. 12_final_extra_bounded/results/params/params_lasso_quadratic.csv), so that the params files
+  of different datasets with the same name can be told apart.
+
+Usage: python 4_evaluation_matrix.py --datasets Datasets/12_final_extra_bounded Datasets/13_session
+           --params Datasets/12_final_extra_bounded/results/params/params_lasso_quadratic.csv ... [--split val]
+
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from fts_dataset import load_dataset
+from fts_polynomial import PolynomialModel, wrench_names
+from fts_profiling import Profiler
+
+groups = {'F': [0, 1, 2], 'M': [3, 4, 5]}
+
+
+# Function to load the samples of a dataset: one split (train / val) or both ('all')
+def load_split(directory, split):
+    if split != 'all':
+        S, W, _ = load_dataset(directory, split)
+        return S, W
+    parts = [load_dataset(directory, s)[:2] for s in ('train', 'val')]
+    return np.vstack([p[0] for p in parts]), np.vstack([p[1] for p in parts])
+
+
+# Function to accumulate the error sums of a model on S, W, in blocks of rows
+def error_sums(model, S, W, chunk_rows=1 << 20):
+    sums = {name: np.zeros(len(wrench_names)) for name in ('e', 'e2', 'abs', 'max', 'w', 'w2')}
+    for a in range(0, len(S), chunk_rows):
+        Wb = W[a:a + chunk_rows]
+        e = model.predict(S[a:a + chunk_rows]) - Wb
+        sums['e'] += e.sum(axis=0)
+        sums['e2'] += (e * e).sum(axis=0)
+        sums['abs'] += np.abs(e).sum(axis=0)
+        sums['max'] = np.maximum(sums['max'], np.abs(e).max(axis=0))
+        sums['w'] += Wb.sum(axis=0)
+        sums['w2'] += (Wb * Wb).sum(axis=0)
+    return sums
+
+
+# Function to evaluate some params files on one dataset, returns the rows of evaluation.csv
+def evaluate_dataset(directory, params_files, split):
+    S, W = load_split(directory, split)
+    n = len(S)
+    rows = []
+    for params in params_files:
+        model = PolynomialModel.from_csv(params)
+        sums = error_sums(model, S, W)
+        ss_tot = sums['w2'] - sums['w'] ** 2 / max(n, 1)
+        for k, w in enumerate(wrench_names):
+            rows.append({
+                'dataset': directory, 'params': params, 'fit_hash': model.fit_hash, 'Wrench': w, 'n': n,
+                'bias': sums['e'][k] / n, 'mae': sums['abs'][k] / n, 'rmse': np.sqrt(sums['e2'][k] / n),
+                'max_error': sums['max'][k],
+                'r2': 1 - sums['e2'][k] / ss_tot[k] if ss_tot[k] > 0 else np.nan,
+                'sse': sums['e2'][k],
+            })
+    return rows
+
+
+# Function to label the params files with their path relative to the common folder of all of them
+def params_names(params_files):
+    if len(params_files) == 1:
+        return {params_files[0]: os.path.basename(params_files[0])}
+    common = os.path.commonpath([os.path.dirname(os.path.abspath(p)) for p in params_files])
+    return {p: os.path.relpath(os.path.abspath(p), common) for p in params_files}
+
+
+def main(profiler):
+    parser = argparse.ArgumentParser(description='Evaluate every params file on every dataset.')
+    parser.add_argument('--datasets', nargs='+', required=True, help='dataset directories')
+    parser.add_argument('--params', nargs='+', required=True, help='params csv files')
+    parser.add_argument('--split', default='val', choices=['train', 'val', 'all'], help='samples of each dataset')
+    parser.add_argument('--output-dir', default='Datasets/evaluation')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='number of processes')
+    args = parser.parse_args()
+
+    start_time = time.perf_counter()
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    # One task per dataset, or per group of params if there are more workers than datasets
+    n_groups = max(1, min(len(args.params), -(-args.workers // len(args.datasets))))
+    params_groups = [list(g) for g in np.array_split(np.array(args.params, dtype=object), n_groups) if len(g)]
+    tasks = [(d, g) for d in args.datasets for g in params_groups]
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = [pool.submit(evaluate_dataset, d, g, args.split) for d, g in tasks]
+        rows = [row for future in futures for row in future.result()]
+    profiler.lap('evaluate')
+
+    results = pd.DataFrame(rows)
+    results.drop(columns=['sse']).to_csv(os.path.join(args.output_dir, 'evaluation.csv'), index=False)
+
+    # Matrices (params x datasets) of the forces and moments, each group pooled over its 3 axes
+    results['group'] = results['Wrench'].map({w: g for g, idx in groups.items() for w in np.array(wrench_names)[idx]})
+    pooled = results.groupby(['params', 'dataset', 'group'], sort=False).agg(
+        n=('n', 'sum'), sse=('sse', 'sum'), mae=('mae', 'mean'), max_error=('max_error', 'max')).reset_index()
+    pooled['rmse'] = np.sqrt(pooled['sse'] / pooled['n'])
+    labels = {d: os.path.basename(os.path.normpath(d)) for d in args.datasets}
+    params_labels = params_names(args.params)
+    for group in groups:
+        for metric in ('rmse', 'mae', 'max_error'):
+            matrix = pooled[pooled['group'] == group].pivot(index='params', columns='dataset', values=metric)
+            matrix = matrix.loc[args.params, args.datasets].rename(columns=labels)
+            matrix.index = [params_labels[p] for p in matrix.index]
+            matrix.to_csv(os.path.join(args.output_dir, f'evaluation_matrix_{metric}_{group}.csv'))
+            if metric == 'rmse':
+                print(f"\nRMSE of the {'forces (N)' if group == 'F' else 'moments (Nm)'}:")
+                print(matrix.to_string(float_format=lambda x: f'{x:.4f}'))
+    profiler.lap('save')
+
+    print(f"\nEvaluated {len(args.params)} params files on {len(args.datasets)} datasets "
+          f"({len(tasks)} tasks, {args.workers} processes) in {time.perf_counter() - start_time:.2f} s.")
+    print(f"Results saved in {args.output_dir}")
+
+
+if __name__ == '__main__':
+    profiler = Profiler.from_argv()  # --profile option (see fts_profiling.py), only the main process is profiled
+    try:
+        main(profiler)
+    except KeyboardInterrupt:
+        # ctrl-C abort handling
+        print('Stopped.')
+    except Exception as exp:
+        print("Exception. Something went wrong.")
+        profiler.exception()
+        sys.exit(1)
@@ -0,0 +1,132 @@
+"""
+
+This file quantizes a calibrated model (params_*.csv, see fts_polynomial.py) into integer coefficients,
+to evaluate it without floating point (e.g. in the microcontroller of the sensor).
+
+Each coefficient is stored as a signed integer of the chosen bit width and its own shift:
+coefficient ~ Coefficient / 2^Shift, where the terms (s_i, s_i*s_j, ...) are products of the raw sensor values
+(integers from 0 to 1023). The products are summed in a 64 bit accumulator with acc_frac_bits fractional bits,
+and the sum is rounded once to the output_frac_bits fractional bits of the wrench:
+W_int = (C_int + sum of ((Coefficient * term) >> (Shift - acc_frac_bits))) >> (acc_frac_bits - output_frac_bits)
+(rounded shifts). Rounding each product to the output bits would add up their rounding errors
+and hide the effect of the bit width of the coefficients.
+All the operations are integer multiplications, additions and shifts.
+
+The quantized model is stored in a csv file, one row per coefficient:
+< Wrench, Term, Coefficient, Shift >   (Term C is the bias, in accumulator units: Shift = acc_frac_bits)
+
+Then the integer-only evaluation is compared with the float model on the validation data,
+and the worst-case and RMS errors are printed and stored for each bit width.
+
+"""
+
+import numpy as np
+import pandas as pd
+import sys
+
+from fts_dataset import load_dataset
+from fts_polynomial import PolynomialModel, wrench_names
+from fts_profiling import Profiler
+
+profiler = Profiler.from_argv()  # --profile option (see fts_profiling.py)
+
+directory = 'Datasets/12_final_extra_bounded'
+params_name = 'params_lasso_quadratic'
+bit_widths = [16, 24, 32]  # bits of the integer coefficients (sign included)
+output_frac_bits = 16  # fractional bits of the wrench (1/65536 N or Nm)
+acc_frac_bits = 32  # fractional bits of the accumulator
+max_sensor_value = 1023
+
+# Function to quantize the model: integer coefficients (6 x terms) and shifts, and integer bias (6,) with frac_bits
+# fractional bits (those of the accumulator)
+def quantize(model, bits, frac_bits):
+    coef = model.coef
+    shift = np.zeros(coef.shape, dtype=np.int64)
+    nonzero = coef != 0
+    # Largest shift such that |coefficient| * 2^shift < 2^(bits - 1)
+    shift[nonzero] = bits - 2 - np.floor(np.log2(np.abs(coef[nonzero]))).astype(np.int64)
+    coef_int = np.clip(np.round(coef * 2.0 ** shift), -2 ** (bits - 1), 2 ** (bits - 1) - 1).astype(np.int64)
+    # Coefficients too small to contribute anything to the output are dropped
+    dropped = shift - frac_bits > 62
+    coef_int[dropped], shift[dropped] = 0, frac_bits
+    C_int = np.round(model.C * 2.0 ** frac_bits).astype(np.int64)
+    # Check that the products fit in 64 bits, before their shift and after it (the left shift of the coefficients
+    # with shift < frac_bits), and that the sum of all of them fits in the accumulator
+    max_term = np.array([max_sensor_value ** len(block[0]) for block in model.table
+                         for _ in range(len(block))], dtype=float)
+    products = np.abs(coef_int) * max_term
+    shifted = products * 2.0 ** np.maximum(frac_bits - shift, 0)
+    if max(products.max(), (np.abs(C_int) + shifted.sum(axis=1)).max()) >= 2.0 ** 62:
+        raise ValueError(f'{bits} bit coefficients overflow the 64 bit accumulator for degree {model.degree} '
+                         f'with {frac_bits} fractional bits')
+    return C_int, coef_int, shift
+
+# Function to compute the integer terms (datapoints x terms) of the integer sensor values, from their parents
+def integer_terms(S_int, model):
+    blocks = [S_int.T]
+    for d in range(1, model.degree):
+        blocks.append(blocks[-1][model.parent[d]] * S_int.T[model.table[d][:, -1]])
+    return np.vstack(blocks).T
+
+# Function to shift integers right by n bits (n > 0), rounded
+def rounded_shift(x, n):
+    return (x + (np.int64(1) << (n - 1))) >> n
+
+# Integer-only evaluation of the quantized model for S_int (datapoints x sensors, integers)
+# The products are summed with acc_bits fractional bits, and the sum is rounded once to out_bits fractional bits
+# Returns the wrench in fixed point (datapoints x 6), in units of 2^-out_bits
+def evaluate_int(S_int, model, C_int, coef_int, shift, acc_bits, out_bits):
+    T = integer_terms(np.asarray(S_int, dtype=np.int64), model)
+    acc = np.tile(C_int, (len(T), 1))
+    for k in range(6):
+        products = T * coef_int[k]  # int64, (datapoints x terms)
+        right = shift[k] - acc_bits
+        # Rounded right shift (or left shift for negative values)
+        pos = right > 0
+        products[:, pos] = rounded_shift(products[:, pos], right[pos])
+        products[:, ~pos] = products[:, ~pos] << -right[~pos]
+        acc[:, k] += products.sum(axis=1)
+    return rounded_shift(acc, acc_bits - out_bits) if acc_bits > out_bits else acc
+
+try:
+    model = PolynomialModel.from_csv(f'{directory}/results/params/{params_name}.csv')
+    S_val, W_val, pose_id = load_dataset(directory, 'val')
+    S_int = S_val.astype(np.int64)
+    W_float = model.predict(S_val)
+    profiler.lap('load and predict')
+
+    report = []
+    for bits in bit_widths:
+        C_int, coef_int, shift = quantize(model, bits, acc_frac_bits)
+
+        # Save the quantized model
+        rows = [{'Wrench': w, 'Term': 'C', 'Coefficient': C_int[k], 'Shift': acc_frac_bits}
+                for k, w in enumerate(wrench_names)]
+        rows += [{'Wrench': w, 'Term': name, 'Coefficient': coef_int[k, t], 'Shift': shift[k, t]}
+                 for k, w in enumerate(wrench_names) for t, name in enumerate(model.names) if coef_int[k, t] != 0]
+        pd.DataFrame(rows).to_csv(f'{directory}/results/params/{params_name}_q{bits}.csv', index=False)
+
+        # Compare the integer evaluation with the float model
+        W_fixed = evaluate_int(S_int, model, C_int, coef_int, shift, acc_frac_bits,
+                               output_frac_bits) / 2.0 ** output_frac_bits
+        error = W_fixed - W_float
+        for k, w in enumerate(wrench_names):
+            report.append({'bits': bits, 'Wrench': w, 'max_error': np.abs(error[:, k]).max(),
+                           'rms_error': np.sqrt(np.mean(error[:, k] ** 2))})
+        print(f"{bits} bits: max error {np.abs(error).max():.3e}, RMS error {np.sqrt(np.mean(error ** 2)):.3e} "
+              f"(saved {params_name}_q{bits}.csv)")
+        profiler.lap(f'{bits} bits')
+
+    report = pd.DataFrame(report)
+    report.to_csv(f'{directory}/results/validation/fixed_point_error_{params_name}.csv', index=False)
+    print(report.to_string(index=False))
+
+except KeyboardInterrupt:
+    # ctrl-C abort handling
+    print('Stopped.')
+except Exception as exp:
+    print("Exception. Something went wrong.")
+    profiler.exception()
+    sys.exit(1)
+finally:
+    print('Finished.')
@@ -7,6 +7,9 @@ It also reads the wrench values from the validation data (W_ref).
 
 Then the error is computed by: Error = W_est - W_ref
 
+If the validation data has a pose_id column (see "2_merge_data.py"), the error statistics
+(mean and RMS) are also computed for each pose, to see which poses are badly modelled.
+
 Finally, the error is plotted in three plots:
 1. Force error vs time for each [Fx, Fy, Fz]
 2. Torque error vs time for each [Mx, My, Mz]
@@ -14,10 +17,16 @@ Finally, the error is plotted in three plots:
 
 """
 
+import numpy as np
 import sys
 import pandas as pd
 import matplotlib.pyplot as plt
 
+from fts_dataset import load_dataset, sensor_cols, wrench_cols
+from fts_profiling import Profiler
+
+profiler = Profiler.from_argv()  # --profile option (see fts_profiling.py)
+
 print('Starting...')
 
 # Function to compute the wrench W = [Fx, Fy, Fz, Mx, My, Mz], based on C, L and S (W=C+LS)
@@ -43,7 +52,11 @@ try:
     L = df[['L_s0','L_s1','L_s2','L_s3','L_s4','L_s5','L_s6','L_s7']].values # Shape: (6, 8)
 
     # Read the validation data
-    dfv = pd.read_csv(f'{directory}/val/val_data.csv')
+    S_val, W_val, pose_id = load_dataset(directory, 'val')
+    dfv = pd.DataFrame(np.column_stack([S_val, W_val]), columns=sensor_cols + wrench_cols)
+    if pose_id is not None:
+        dfv['pose_id'] = pose_id
+    profiler.lap('load')
 
     # Initialize lists to store errors
     errors = []
@@ -84,10 +97,35 @@ try:
         }
         errors.append(error_row)
 
+    profiler.lap('compute errors')
+
     # Create DataFrame from errors and save to CSV
     error_df = pd.DataFrame(errors)
     error_df.to_csv(f'{directory}/results/validation/error_{output_name}.csv', index=False)
 
+    # Per-pose error statistics (bincount over the integer pose_id, no groupby)
+    if 'pose_id' in dfv.columns:
+        pose_ids = dfv.loc[error_df['row_index'], 'pose_id'].to_numpy(dtype=np.intp)
+        n_poses = pose_ids.max() + 1
+        counts = np.bincount(pose_ids, minlength=n_poses)
+        valid = counts > 0
+        pose_stats = {'pose_id': np.arange(n_poses), 'count': counts}
+        for col in ['Fx_error', 'Fy_error', 'Fz_error', 'Mx_error', 'My_error', 'Mz_error']:
+            e = error_df[col].to_numpy()
+            sums = np.bincount(pose_ids, weights=e, minlength=n_poses)
+            sq_sums = np.bincount(pose_ids, weights=e * e, minlength=n_poses)
+            pose_stats[f'{col}_mean'] = np.divide(sums, counts, out=np.full(n_poses, np.nan), where=valid)
+            pose_stats[f'{col}_rms'] = np.sqrt(np.divide(sq_sums, counts, out=np.full(n_poses, np.nan), where=valid))
+        pose_df = pd.DataFrame(pose_stats)[valid]
+        # Add the pose description (mass position and RPY) if the pose table exists
+        try:
+            pose_df = pd.read_csv(f'{directory}/poses.csv').drop(columns=['n_rows']).merge(pose_df, on='pose_id')
+        except FileNotFoundError:
+            print('Pose table poses.csv not found, saving per-pose errors without pose description.')
+        pose_df.to_csv(f'{directory}/results/validation/pose_error_{output_name}.csv', index=False)
+
+    profiler.lap('save errors')
+
     # Plot 1: Forces and Moments
     plt.figure(figsize=(12, 5))
     # Subplot 1.1: Forces
@@ -183,6 +221,7 @@ try:
     plt.tight_layout()
     plt.savefig(f'{directory}/results/validation/error_dist_{output_name}.png')
     plt.close()
+    profiler.lap('plots')
 
 
 except KeyboardInterrupt:
@@ -190,6 +229,7 @@ except KeyboardInterrupt:
     print('Stopped.')
 except Exception as exp:
     print("Exception. Something went wrong.")
+    profiler.exception()
     sys.exit(1)
 finally:
     print('Finished.')
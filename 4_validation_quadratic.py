@@ -3,12 +3,17 @@
 This file does the same as "4_validation.py", but including quadratic terms.
 
 It uses the raw sensor values from validation data (s_0 to s_7),
-to compute the estimated wrench using the calibration matrices C and L: W_est = C + LS + QS^2.
+to compute the estimated wrench using the calibration matrices C and L: W_est = C + LS + QS^2
+(plus the higher order terms if the params file has them, see fts_polynomial.py).
+The estimated wrench is computed for all the validation data at once.
 
 It also reads the wrench values from the validation data (W_ref).
 
 Then the error is computed by: Error = W_est - W_ref
 
+If the validation data has a pose_id column (see "2_merge_data.py"), the error statistics
+(mean and RMS) are also computed for each pose, to see which poses are badly modelled.
+
 Finally, the error is plotted in three plots:
 1. Force error vs time for each [Fx, Fy, Fz]
 2. Torque error vs time for each [Mx, My, Mz]
@@ -21,79 +26,67 @@ import sys
 import pandas as pd
 import matplotlib.pyplot as plt
 
-print('Starting...')
+from fts_dataset import load_dataset, sensor_cols, wrench_cols
+from fts_polynomial import PolynomialModel
+from fts_profiling import Profiler
 
-# Function to compute the wrench W = [Fx, Fy, Fz, Mx, My, Mz], based on C, L, Q and S (W=C+LS+QS^2)
-def compute_wrench(C, L, Q, S):
-    W = np.zeros(6)
-    S = np.array(S)
-    # Linear terms: C + LS
-    W += C.flatten() + L @ S
-    # Quadratic terms: QS^2
-    quad_terms = np.array([S[i] * S[j] for i in range(len(S)) for j in range(i, len(S))])
-    W += Q @ quad_terms
-    return W.tolist()
+profiler = Profiler.from_argv()  # --profile option (see fts_profiling.py)
 
-try:
-    n_sensors = 8
-    overload_lower = 50
-    overload_upper = 950
+print('Starting...')
 
-    # Load calibrated C and L
+try:
+    # Load calibrated C, L and Q (and higher order terms if any)
     output_name='val_lasso_quadratic'
     directory = 'Datasets/12_final_extra_bounded'
-    df = pd.read_csv(f'{directory}/results/params/params_lasso_quadratic.csv')
-    C = df[['C']].values # Shape: (6, 1)
-    L = df[['L_s0','L_s1','L_s2','L_s3','L_s4','L_s5','L_s6','L_s7']].values # Shape: (6, 8)
-    Q_cols = [f'Q_s{i}s{j}' for i in range(n_sensors) for j in range(i, n_sensors)]
-    Q = df[Q_cols].values  # Shape: (6, 36)
+    model = PolynomialModel.from_csv(f'{directory}/results/params/params_lasso_quadratic.csv')
+    if model.fit_hash is not None:
+        print(f"Params fit hash: {model.fit_hash}")  # data and settings of the fit (see fts_fit_cache.py)
 
     # Read the validation data
-    dfv = pd.read_csv(f'{directory}/val/val_data.csv')
-
-    # Initialize lists to store errors
-    errors = []
-
-    # Process each row of validation data
-    for index, row in dfv.iterrows():
-        # Get sensor values s0-s7
-        s = [row[f's{i}'] for i in range(n_sensors)]
-
-        # Check for overload
-        #skip_row = False
-        #for i in range(n_sensors):
-        #    if (s[i] < overload_lower) or (s[i] > overload_upper):
-        #        print(f"Force overload channel {i} at row {index}")
-        #        skip_row = True
-        #        break
-        #if skip_row:
-        #    continue
-
-        # Compute estimated wrench
-        W_est = compute_wrench(C, L, Q, s)
-
-        # Get real wrench values
-        W_real = [row['Fx'], row['Fy'], row['Fz'], row['Mx'], row['My'], row['Mz']]
-
-        # Compute error
-        error = [est - real for est, real in zip(W_est, W_real)]
-
-        # Store error with row information
-        error_row = {
-            'row_index': index,
-            'Fx_error': error[0],
-            'Fy_error': error[1],
-            'Fz_error': error[2],
-            'Mx_error': error[3],
-            'My_error': error[4],
-            'Mz_error': error[5]
-        }
-        errors.append(error_row)
+    S_val, W_val, pose_id = load_dataset(directory, 'val')
+    dfv = pd.DataFrame(np.column_stack([S_val, W_val]), columns=sensor_cols + wrench_cols)
+    if pose_id is not None:
+        dfv['pose_id'] = pose_id
+    profiler.lap('load')
+
+    # Compute estimated wrench for all the rows at once
+    W_est = model.predict(S_val)
+    profiler.lap('predict')
+
+    # Compute error
+    error = W_est - W_val
+
+    # Store error with row information
+    errors = {'row_index': dfv.index}
+    errors.update({f'{col}_error': error[:, k] for k, col in enumerate(wrench_cols)})
 
     # Create DataFrame from errors and save to CSV
     error_df = pd.DataFrame(errors)
     error_df.to_csv(f'{directory}/results/validation/error_{output_name}.csv', index=False)
 
+    # Per-pose error statistics (bincount over the integer pose_id, no groupby)
+    if 'pose_id' in dfv.columns:
+        pose_ids = dfv.loc[error_df['row_index'], 'pose_id'].to_numpy(dtype=np.intp)
+        n_poses = pose_ids.max() + 1
+        counts = np.bincount(pose_ids, minlength=n_poses)
+        valid = counts > 0
+        pose_stats = {'pose_id': np.arange(n_poses), 'count': counts}
+        for col in ['Fx_error', 'Fy_error', 'Fz_error', 'Mx_error', 'My_error', 'Mz_error']:
+            e = error_df[col].to_numpy()
+            sums = np.bincount(pose_ids, weights=e, minlength=n_poses)
+            sq_sums = np.bincount(pose_ids, weights=e * e, minlength=n_poses)
+            pose_stats[f'{col}_mean'] = np.divide(sums, counts, out=np.full(n_poses, np.nan), where=valid)
+            pose_stats[f'{col}_rms'] = np.sqrt(np.divide(sq_sums, counts, out=np.full(n_poses, np.nan), where=valid))
+        pose_df = pd.DataFrame(pose_stats)[valid]
+        # Add the pose description (mass position and RPY) if the pose table exists
+        try:
+            pose_df = pd.read_csv(f'{directory}/poses.csv').drop(columns=['n_rows']).merge(pose_df, on='pose_id')
+        except FileNotFoundError:
+            print('Pose table poses.csv not found, saving per-pose errors without pose description.')
+        pose_df.to_csv(f'{directory}/results/validation/pose_error_{output_name}.csv', index=False)
+
+    profiler.lap('save errors')
+
     # Plot 1: Forces and Moments
     plt.figure(figsize=(12, 5))
     # Subplot 1.1: Forces
@@ -189,6 +182,7 @@ try:
     plt.tight_layout()
     plt.savefig(f'{directory}/results/validation/error_dist_{output_name}.png')
     plt.close()
+    profiler.lap('plots')
 
 
 except KeyboardInterrupt:
@@ -196,6 +190,7 @@ except KeyboardInterrupt:
     print('Stopped.')
 except Exception as exp:
     print("Exception. Something went wrong.")
+    profiler.exception()
     sys.exit(1)
 finally:
     print('Finished.')
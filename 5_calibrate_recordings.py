@@ -0,0 +1,173 @@
+"""
+
+This file applies a calibrated model (params_*.csv, see fts_polynomial.py) to recorded raw data,
+and writes the wrench of every sample, without loading the whole recordings in memory.
+
+The recordings can be:
+- csv files with the raw sensor values (s0 to s7, and optionally Timestamp and other columns).
+  The wrench is written in <name>_wrench.csv: < Timestamp (if any), Fx, Fy, Fz, Mx, My, Mz >
+- binary files: .bin with the raw values as uint16 (little-endian, 8 values per sample),
+  or .npy with an (n x 8) array or a table with s0 to s7 fields.
+  The wrench is written in <name>_wrench.npy as an (n x 6) float64 array.
+
+Each file is split in chunks (csv files by bytes, at line boundaries), and the chunks of all the files
+are processed in parallel by a pool of processes, each computing the wrench of its chunk at once.
+
+Usage: python 5_calibrate_recordings.py <files or directories> --params <params csv> [--workers N]
+
+"""
+
+import argparse
+import glob
+import io
+import os
+import shutil
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from fts_polynomial import PolynomialModel, wrench_names
+from fts_profiling import Profiler
+
+sensor_cols = ['s0', 's1', 's2', 's3', 's4', 's5', 's6', 's7']
+
+model = None  # calibrated model, loaded once in each worker process
+
+def load_model(params):
+    global model
+    model = PolynomialModel.from_csv(params)
+
+# Function to open the raw values of a binary recording as a memory-mapped (n x 8) array
+def open_binary(file):
+    if file.endswith('.bin'):
+        return np.memmap(file, dtype='<u2', mode='r').reshape(-1, len(sensor_cols))
+    data = np.load(file, mmap_mode='r')
+    if data.dtype.names is not None:
+        return data  # table with s0 to s7 fields
+    return data.reshape(len(data), -1)
+
+# Function to compute the wrench of rows a to b of a binary recording, written into the output array
+def process_binary_chunk(file, out_file, a, b):
+    data = open_binary(file)[a:b]
+    S = np.column_stack([data[c] for c in sensor_cols]) if data.dtype.names is not None else data
+    out = np.load(out_file, mmap_mode='r+')
+    out[a:b] = model.predict(S)
+    out.flush()
+    return b - a
+
+# Function to compute the wrench of the csv lines starting between the bytes start and end of a file
+def process_csv_chunk(file, columns, start, end, part_file):
+    with open(file, 'rb') as f:
+        # Skip the line that started in the previous chunk
+        f.seek(start - 1)
+        if f.read(1) != b'\n':
+            f.readline()
+        pos = f.tell()
+        data = f.read(end - pos) if pos < end else b''
+        if data and not data.endswith(b'\n'):
+            data += f.readline()
+    if not data.strip():
+        open(part_file, 'w').close()
+        return 0
+    df = pd.read_csv(io.BytesIO(data), names=columns, header=None)
+    out = pd.DataFrame(model.predict(df[sensor_cols].to_numpy(dtype=float)), columns=wrench_names)
+    if 'Timestamp' in columns:
+        out.insert(0, 'Timestamp', df['Timestamp'].to_numpy())
+    out.to_csv(part_file, index=False, header=False)
+    return len(out)
+
+# Function to split a csv file in chunks of about chunk_bytes, returns the columns and the tasks
+def csv_tasks(file, out_dir, chunk_bytes):
+    with open(file, 'rb') as f:
+        header = f.readline()
+    columns = header.decode().strip().split(',')
+    size = os.path.getsize(file)
+    bounds = list(range(len(header), size, chunk_bytes)) + [size]
+    name = os.path.splitext(os.path.basename(file))[0]
+    return columns, [(file, columns, a, b, os.path.join(out_dir, f'{name}_wrench.part{k}'))
+                     for k, (a, b) in enumerate(zip(bounds[:-1], bounds[1:]))]
+
+def main(profiler):
+    parser = argparse.ArgumentParser(description='Apply a calibrated model to recorded raw data.')
+    parser.add_argument('inputs', nargs='+', help='recordings (.csv, .bin, .npy) or directories with recordings')
+    parser.add_argument('--params', required=True, help='params csv file of the calibrated model')
+    parser.add_argument('--output-dir', default=None, help='output directory (default: next to each recording)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='number of processes')
+    parser.add_argument('--chunk-mb', type=float, default=64, help='size of the chunks processed at once')
+    args = parser.parse_args()
+
+    # List the recordings
+    files = []
+    for path in args.inputs:
+        if os.path.isdir(path):
+            files += sorted(f for ext in ('csv', 'bin', 'npy') for f in glob.glob(os.path.join(path, f'*.{ext}'))
+                            if not os.path.splitext(f)[0].endswith('_wrench'))
+        else:
+            files.append(path)
+    chunk_bytes = max(int(args.chunk_mb * 2 ** 20), 1)
+    profiler.lap('list recordings')
+
+    # Prepare the tasks of every file (the output of binary files is preallocated)
+    csv_outputs = []
+    binary_tasks = []
+    csv_chunk_tasks = []
+    for file in files:
+        out_dir = args.output_dir or os.path.dirname(os.path.abspath(file))
+        os.makedirs(out_dir, exist_ok=True)
+        name = os.path.splitext(os.path.basename(file))[0]
+        if file.endswith('.csv'):
+            columns, tasks = csv_tasks(file, out_dir, chunk_bytes)
+            missing = [c for c in sensor_cols if c not in columns]
+            if missing:
+                print(f"Warning: {file} has no columns {missing}, skipped")
+                continue
+            header = (['Timestamp'] if 'Timestamp' in columns else []) + wrench_names
+            csv_outputs.append((os.path.join(out_dir, f'{name}_wrench.csv'), header, [t[-1] for t in tasks]))
+            csv_chunk_tasks += tasks
+        elif file.endswith(('.bin', '.npy')):
+            n = len(open_binary(file))
+            out_file = os.path.join(out_dir, f'{name}_wrench.npy')
+            np.lib.format.open_memmap(out_file, mode='w+', dtype=np.float64, shape=(n, len(wrench_names))).flush()
+            rows = max(chunk_bytes // (2 * len(sensor_cols)), 1)
+            binary_tasks += [(file, out_file, a, min(a + rows, n)) for a in range(0, n, rows)]
+        else:
+            print(f"Warning: {file} is not a csv, bin or npy file, skipped")
+
+    profiler.lap('prepare chunks')
+
+    # Process all the chunks in parallel
+    n_rows = 0
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=load_model, initargs=(args.params,)) as pool:
+        futures = [pool.submit(process_csv_chunk, *t) for t in csv_chunk_tasks]
+        futures += [pool.submit(process_binary_chunk, *t) for t in binary_tasks]
+        for future in futures:
+            n_rows += future.result()
+
+    profiler.lap('process chunks')
+
+    # Join the parts of the csv outputs, in order
+    for out_file, header, parts in csv_outputs:
+        with open(out_file, 'w', newline='') as out:
+            out.write(','.join(header) + '\n')
+            for part in parts:
+                with open(part) as f:
+                    shutil.copyfileobj(f, out)
+                os.remove(part)
+    profiler.lap('join csv outputs')
+
+    print(f"Calibrated {n_rows} samples from {len(files)} files "
+          f"({len(csv_chunk_tasks) + len(binary_tasks)} chunks, {args.workers} processes).")
+
+if __name__ == '__main__':
+    profiler = Profiler.from_argv()  # --profile option (see fts_profiling.py), only the main process is profiled
+    try:
+        main(profiler)
+    except KeyboardInterrupt:
+        # ctrl-C abort handling
+        print('Stopped.')
+    except Exception as exp:
+        print("Exception:", exp)
+        profiler.exception()
+        sys.exit(1)
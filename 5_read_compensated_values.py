@@ -0,0 +1,160 @@
+"""
+
+This file does the same as "5_read_calibrated_values_quadratic.py", but subtracts the wrench of the payload
+(e.g. the tool mounted on the sensor, of mass m with its COG at r in the sensor frame) from the live wrench,
+using the orientation of the robot streamed at the same time (see fts_gravity.py and fts_robot.py).
+
+The orientation is received from a local UDP port (one "roll pitch yaw" datagram per orientation, in radians),
+or simulated with --simulate-orientation. The trig of each orientation is computed once when it arrives.
+
+The sensor samples are read in their own thread (see fts_serial.py) and processed in small batches: a batch is
+processed when it has --batch samples or when its oldest sample has waited half of the latency budget (--budget-ms).
+Each sample is compensated with the last orientation received before it. The latency of every sample
+(from its reception to its compensated wrench) is measured, and its percentiles are printed at the end,
+with the number of samples over the budget.
+
+With --plot, the compensated wrench and the raw values are also shown in a live scrolling plot,
+drawn in its own process at --fps frames per second (see fts_live_plot.py).
+
+Usage: python 5_read_compensated_values.py --mass 0.35 --cog 0 0 0.04 [--simulate-orientation] [--output wrench.csv]
+
+"""
+
+import argparse
+import collections
+import sys
+import time
+
+import numpy as np
+
+from fts_gravity import PayloadCompensator
+from fts_live_plot import LivePlot
+from fts_polynomial import PolynomialModel, wrench_names
+from fts_profiling import Profiler
+from fts_robot import SimulatedOrientationStream, UdpOrientationStream
+from fts_serial import SensorReader
+
+
+def main(profiler):
+    parser = argparse.ArgumentParser(description='Live wrench with the payload weight compensated.')
+    parser.add_argument('--params', default='Datasets/7_offcenter_mass_1_and_3/linearization_params_with_quadratic.csv')
+    parser.add_argument('--port', default='COM3')
+    parser.add_argument('--mass', type=float, required=True, help='payload mass (kg)')
+    parser.add_argument('--cog', type=float, nargs=3, default=[0.0, 0.0, 0.0],
+                        help='payload COG in the sensor frame (m)')
+    parser.add_argument('--g', type=float, default=9.81)
+    parser.add_argument('--orientation-port', type=int, default=5005, help='local UDP port of the orientation stream')
+    parser.add_argument('--simulate-orientation', action='store_true', help='use a simulated orientation stream')
+    parser.add_argument('--budget-ms', type=float, default=5.0, help='latency budget of each sample (ms)')
+    parser.add_argument('--batch', type=int, default=32, help='maximum samples per batch')
+    parser.add_argument('--print-rate', type=float, default=10.0, help='printed wrenches per second')
+    parser.add_argument('--output', default=None, help='csv file for every compensated sample')
+    parser.add_argument('--plot', action='store_true', help='live plot of the wrench and the raw values')
+    parser.add_argument('--fps', type=float, default=30, help='frame rate of the live plot')
+    parser.add_argument('--window', type=int, default=2000, help='samples shown in the live plot')
+    args = parser.parse_args()
+
+    model = PolynomialModel.from_csv(args.params)
+    compensator = PayloadCompensator(args.mass, args.cog, args.g)
+    budget = args.budget_ms / 1000
+    profiler.lap('load params')
+
+    # Shared clock of the sensor samples and the orientations
+    t0 = time.monotonic()
+    if args.simulate_orientation:
+        stream = SimulatedOrientationStream(t0=t0)
+    else:
+        stream = UdpOrientationStream(args.orientation_port, t0=t0)
+    pending = collections.deque()  # (timestamp, s) of the samples not processed yet (appended by the reader thread)
+    reader = SensorReader(args.port, lambda timestamp, seq_number, s: pending.append((timestamp, s)), t0=t0)
+    output = open(args.output, 'w') if args.output else None
+    if output:
+        output.write(','.join(['Timestamp'] + wrench_names + ['latency_ms']) + '\n')
+
+    # Statistics: latencies of the last samples (ring buffer), batches and processing time
+    latencies = np.zeros(1 << 16)
+    n_samples = n_late = n_no_orientation = n_batches = 0
+    processing_time = 0.0
+    last_print = 0.0
+
+    plot = LivePlot(args.window, args.fps, 'Live wrench (payload compensated)').start() if args.plot else None
+
+    print('Starting...')
+    reader.start()
+    try:
+        while True:
+            if reader.error is not None:
+                raise reader.error
+            compensator.add_orientations(*stream.read())
+
+            # Wait until the batch is full or its oldest sample has used half of the budget
+            now = time.monotonic() - t0
+            if len(pending) < args.batch and not (pending and now - pending[0][0] >= budget / 2):
+                time.sleep(budget / 10)
+                continue
+            batch = [pending.popleft() for _ in range(min(len(pending), args.batch))]
+            if compensator.count == 0:
+                n_no_orientation += len(batch)  # no orientation yet, the samples cannot be compensated
+                continue
+
+            start_time = time.monotonic()
+            t = np.array([b[0] for b in batch])
+            S = np.array([b[1] for b in batch], dtype=float)
+            W = compensator.compensate(t, model.predict(S))
+            done = time.monotonic()
+            latency = done - t0 - t
+            processing_time += done - start_time
+
+            index = np.arange(n_samples, n_samples + len(batch)) % len(latencies)
+            latencies[index] = latency
+            n_samples += len(batch)
+            n_late += int((latency > budget).sum())
+            n_batches += 1
+            if output:
+                np.savetxt(output, np.column_stack([t, W, 1000 * latency]), fmt='%.6f', delimiter=',')
+            if plot is not None:
+                plot.push_batch(W, S)
+
+            # Print line
+            if done - t0 - last_print >= 1 / args.print_rate:
+                last_print = done - t0
+                Fx, Fy, Fz, Mx, My, Mz = W[-1]
+                print(f"Fx: {Fx:.3f}, Fy: {Fy:.3f}, Fz: {Fz:.3f}, Mx: {Mx:.3f}, My: {My:.3f}, Mz: {Mz:.3f} "
+                      f"(payload compensated, latency {1000 * latency[-1]:.2f} ms)")
+
+    except KeyboardInterrupt:
+        # ctrl-C abort handling
+        print('Stopped.')
+    finally:
+        reader.stop()
+        reader.join(timeout=2)
+        stream.close()
+        if output:
+            output.close()
+        if plot is not None:
+            plot.close()
+        profiler.lap('read loop')
+
+    # Latency report
+    print(f"\n{n_samples} samples compensated in {n_batches} batches "
+          f"(mean batch {n_samples / max(n_batches, 1):.1f} samples, "
+          f"mean processing {1000 * processing_time / max(n_batches, 1):.3f} ms per batch)")
+    if n_samples > 0:
+        recent = latencies[:min(n_samples, len(latencies))] * 1000
+        p50, p99 = np.percentile(recent, [50, 99])
+        print(f"Latency: median {p50:.2f} ms, p99 {p99:.2f} ms, max {recent.max():.2f} ms "
+              f"(last {len(recent)} samples), {n_late} samples ({100 * n_late / n_samples:.2f} %) "
+              f"over the {args.budget_ms:g} ms budget")
+    if n_no_orientation:
+        print(f"{n_no_orientation} samples skipped before the first orientation")
+    print(reader.stats())
+
+
+if __name__ == '__main__':
+    profiler = Profiler.from_argv()  # --profile option (see fts_profiling.py)
+    try:
+        main(profiler)
+    except Exception as exp:
+        print("Exception:", exp)
+        profiler.exception()
+        sys.exit(1)
@@ -0,0 +1,127 @@
+"""
+
+Bootstrap of the calibration coefficients, resampling whole poses (the samples of a pose are not independent).
+
+The standardized design matrix A = [1, X] (X: standardized terms, as in fit_polynomial) is reduced once
+to sufficient statistics per pose: A^T A, A^T W and the sum of W^2. A replicate draws the poses with
+replacement, so its normal equations are the sums of the statistics of the drawn poses weighted by how many
+times each pose is drawn, and no raw rows are touched again:
+- linearregression / ridge: solved with Cholesky, as in fit_polynomial.
+- lasso: sklearn's Lasso on the Cholesky factor of the normal equations (same objective, but with
+  as many rows as terms), warm-started from the fit on all the poses.
+
+With per-sample weights (weighted least squares, see sample_weights in fts_polynomial.py), the statistics
+are weighted sums (A^T diag(w) A...), and the bootstrap counts of the poses multiply them.
+
+The standardization constants are computed once on all the data (they only reparametrize the model),
+and every replicate is folded back to raw C, L, Q... (see fts_polynomial.py).
+
+"""
+
+import numpy as np
+from scipy.linalg import cho_factor, cho_solve, solve_triangular
+
+from fts_polynomial import features, fold_standardization, weighted_mean_std
+
+
+# Per-pose sufficient statistics of a dataset, and the standardization constants to build the design matrix
+class PoseStatistics:
+
+    def __init__(self, S, W, pose_id, degree, chunk_size=100000, weights=None):
+        S = np.asarray(S, dtype=float)
+        W = np.asarray(W, dtype=float)
+        # Per-sample weights, normalized to mean 1 (as in fit_polynomial)
+        w = np.ones(len(S)) if weights is None else np.asarray(weights, dtype=float) / np.mean(weights)
+        self.degree = degree
+        self.mu, self.sigma = weighted_mean_std(S, w)
+        self.sigma[self.sigma == 0] = 1.0
+
+        # Weighted mean and std of the terms, accumulated by chunks
+        n_terms = features(S[:1], degree).shape[1]
+        total, total_sq = np.zeros(n_terms), np.zeros(n_terms)
+        for a in range(0, len(S), chunk_size):
+            Z = features((S[a:a + chunk_size] - self.mu) / self.sigma, degree)
+            wb = w[a:a + chunk_size]
+            total += wb @ Z
+            total_sq += wb @ Z ** 2
+        self.z_mean = total / w.sum()
+        self.z_std = np.sqrt(np.maximum(total_sq / w.sum() - self.z_mean ** 2, 0.0))
+        self.z_std[self.z_std == 0] = 1.0
+
+        # Statistics of each pose (poses in order of their id)
+        self.poses, pose_index = np.unique(pose_id, return_inverse=True)
+        n_poses, p = len(self.poses), n_terms + 1
+        self.AtA = np.zeros((n_poses, p, p))
+        self.AtW = np.zeros((n_poses, p, W.shape[1]))
+        self.WtW = np.zeros((n_poses, W.shape[1]))
+        order = np.argsort(pose_index, kind='stable')
+        bounds = np.searchsorted(pose_index[order], np.arange(n_poses + 1))
+        for k in range(n_poses):
+            rows = order[bounds[k]:bounds[k + 1]]
+            for a in range(0, len(rows), chunk_size):
+                A = self.design(S[rows[a:a + chunk_size]])
+                Wk = W[rows[a:a + chunk_size]]
+                Aw = A * w[rows[a:a + chunk_size], None]
+                self.AtA[k] += Aw.T @ A
+                self.AtW[k] += Aw.T @ Wk
+                self.WtW[k] += w[rows[a:a + chunk_size]] @ Wk ** 2
+
+    # Standardized design matrix [1, X] of S (datapoints x sensors)
+    def design(self, S):
+        X = (features((np.asarray(S, dtype=float) - self.mu) / self.sigma, self.degree) - self.z_mean) / self.z_std
+        return np.column_stack([np.ones(len(X)), X])
+
+    # Weighted sums of the statistics (weights: how many times each pose is drawn)
+    def normal_equations(self, weights):
+        weights = np.asarray(weights, dtype=float)
+        return (np.tensordot(weights, self.AtA, axes=1), np.tensordot(weights, self.AtW, axes=1),
+                weights @ self.WtW)
+
+    # Function to fit the coefficients for some pose weights
+    # Returns theta (terms + 1, 6) in standardized coordinates (first row: bias) and the raw C (6,) and coef (6, terms)
+    def fit(self, weights, estimator='linearregression', alpha=1.0, beta0=None):
+        G, b, _ = self.normal_equations(weights)
+        n = G[0, 0]
+        m, y_mean = G[0, 1:] / n, b[0] / n
+        # Centered normal equations (the bias is not penalized, as with sklearn's fit_intercept)
+        Gc = G[1:, 1:] - n * np.outer(m, m)
+        bc = b[1:] - n * np.outer(m, y_mean)
+        if estimator in ('linearregression', 'ridge'):
+            penalty = alpha if estimator == 'ridge' else 0.0
+            Gc[np.diag_indices_from(Gc)] += penalty
+            beta = cho_solve(cho_factor(Gc), bc)
+        elif estimator == 'lasso':
+            beta = lasso_gram(Gc, bc, n, alpha, beta0)
+        else:
+            raise ValueError(f'Invalid estimator: {estimator}')
+        theta = np.vstack([y_mean - m @ beta, beta])
+
+        # Undo the standardization of the terms, and then of the sensor values
+        coef_z = (beta / self.z_std[:, None]).T
+        C, coef = fold_standardization(theta[0] - coef_z @ self.z_mean, coef_z, self.mu, self.sigma, self.degree)
+        return theta, C, coef
+
+    # Residual variance of each wrench value for the coefficients theta, with the same pose weights
+    def residual_variance(self, theta, weights):
+        G, b, WtW = self.normal_equations(weights)
+        rss = WtW - 2 * np.einsum('pk,pk->k', theta, b) + np.einsum('pk,pq,qk->k', theta, G, theta)
+        return np.maximum(rss, 0.0) / max(G[0, 0] - len(theta), 1.0)
+
+
+# Function to solve a Lasso from its centered normal equations (G = X^T X, c = X^T y, n datapoints)
+# The Cholesky factor R of G (G = R^T R) is an equivalent design matrix with only terms rows:
+# |y - X beta|^2 = |R^-T c - R beta|^2 + const, so sklearn's Lasso runs on (R, R^-T c) with alpha scaled by n / terms
+def lasso_gram(G, c, n, alpha, beta0=None):
+    from sklearn.linear_model import Lasso
+    R = np.linalg.cholesky(G).T
+    y = solve_triangular(R, c, trans='T')
+    lasso = Lasso(alpha=alpha * n / len(G), fit_intercept=False, precompute=True, max_iter=100000,
+                  warm_start=beta0 is not None)
+    if beta0 is not None:
+        lasso.coef_ = np.array(beta0, dtype=float).T.copy()
+    return lasso.fit(R, y).coef_.T
+
+
+# Function to draw the pose weights of a bootstrap replicate (number of times each pose is drawn)
+def resample_poses(n_poses, rng):
+    return np.bincount(rng.integers(0, n_poses, n_poses), minlength=n_poses)
@@ -0,0 +1,67 @@
+"""
+
+Shared storage of the merged datasets in a normalized, columnar layout.
+
+The wrench is computed once per pose, so it is stored only once, in the pose table (poses.csv):
+< pose_id, pos, roll, pitch, yaw, Fx, Fy, Fz, Mx, My, Mz, file, n_rows >
+
+The samples are stored once in the merged folder, one binary file (.npy) per column:
+< pose_id (uint16), Timestamp (float64), s0, s1, s2, s3, s4, s5, s6, s7 (uint16) >
+
+and the train / validation splits are stored as arrays of row indices (train_idx.npy, val_idx.npy).
+
+load_dataset memory-maps only the columns it needs, and expands them into the arrays used
+for fitting and validation: S (n x 8 raw sensor values) and W (n x 6 wrench values).
+
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+wrench_cols = ['Fx', 'Fy', 'Fz', 'Mx', 'My', 'Mz']
+sensor_cols = ['s0', 's1', 's2', 's3', 's4', 's5', 's6', 's7']
+
+column_dtypes = {'pose_id': np.uint16, 'Timestamp': np.float64, **{c: np.uint16 for c in sensor_cols}}
+
+
+# Function to save the sample columns (pose_id, Timestamp, s0 to s7) of a DataFrame or dict of arrays in the merged folder
+def save_columns(directory, df):
+    os.makedirs(os.path.join(directory, 'merged'), exist_ok=True)
+    for col, dtype in column_dtypes.items():
+        np.save(os.path.join(directory, 'merged', f'{col}.npy'), np.asarray(df[col]).astype(dtype, copy=False))
+
+
+# Function to save the row indices of a split (train / val)
+def save_split(directory, split, idx):
+    np.save(os.path.join(directory, 'merged', f'{split}_idx.npy'), np.sort(np.asarray(idx)).astype(np.uint32))
+
+
+# Function to load some columns of the merged samples (memory-mapped), only the rows of a split if given
+def load_columns(directory, columns, split=None):
+    merged = os.path.join(directory, 'merged')
+    idx = np.load(os.path.join(merged, f'{split}_idx.npy')) if split is not None else slice(None)
+    return {col: np.load(os.path.join(merged, f'{col}.npy'), mmap_mode='r')[idx] for col in columns}
+
+
+# Function to expand the pose ids into W (n x 6), looking up the wrench of each pose
+def expand_wrench(poses, pose_id):
+    # Dense lookup table indexed by pose_id
+    W_pose = np.full((poses['pose_id'].max() + 1, len(wrench_cols)), np.nan)
+    W_pose[poses['pose_id'].to_numpy()] = poses[wrench_cols].to_numpy(dtype=float)
+    return W_pose[pose_id]
+
+
+# Function to load a split (train / val) of a dataset directory as S (n x 8), W (n x 6) and pose_id (n,)
+# Falls back to the old <split>/<split>_data.csv file if the dataset was merged before the columnar layout
+def load_dataset(directory, split):
+    if os.path.exists(os.path.join(directory, 'merged', f'{split}_idx.npy')):
+        poses = pd.read_csv(os.path.join(directory, 'poses.csv'))
+        columns = load_columns(directory, ['pose_id'] + sensor_cols, split)
+        pose_id = columns['pose_id'].astype(np.intp)
+        S = np.column_stack([columns[c] for c in sensor_cols]).astype(float)
+        return S, expand_wrench(poses, pose_id), pose_id
+    df = pd.read_csv(os.path.join(directory, split, f'{split}_data.csv'))
+    pose_id = df['pose_id'].to_numpy(dtype=np.intp) if 'pose_id' in df.columns else None
+    return df[sensor_cols].to_numpy(dtype=float), df[wrench_cols].to_numpy(dtype=float), pose_id
@@ -0,0 +1,69 @@
+"""
+
+Content-addressed cache of the fitted calibration models.
+
+The key of a fit is a SHA-256 hash of everything the coefficients depend on: the training data (S and W,
+in float64), the feature configuration (degree, number of sensors) and the estimator hyperparameters
+(estimator, alpha, solver), the sample weights of a weighted fit, plus cache_version, to be increased whenever the fitting code changes its results.
+
+The cache is a folder with one params csv per key (<hash>.csv) and the fit info (<hash>.json).
+A fit whose key is already in the cache is not run again, and the params are loaded instead.
+The hash is stored in the fit_hash column of the params files (see PolynomialModel), so the data
+a params file came from can be checked later with fit_hash().
+
+"""
+
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from fts_polynomial import PolynomialModel, fit_polynomial
+
+cache_version = 1
+
+
+# Function to compute the key of a fit (hex SHA-256)
+def fit_hash(S, W, degree, estimator='linearregression', alpha=1.0, solver='cholesky', weights=None, chunk_size=100000):
+    config = {
+        'version': cache_version,
+        'degree': degree,
+        'n_sensors': np.shape(S)[1],
+        'estimator': estimator,
+        'alpha': float(alpha) if estimator in ('ridge', 'lasso') else None,  # ignored by the other estimators
+        'solver': solver if estimator in ('linearregression', 'ridge') else None,
+    }
+    if weights is not None:
+        config['weighted'] = True  # (only in weighted fits, so the keys of the unweighted fits do not change)
+    h = hashlib.sha256(json.dumps(config, sort_keys=True).encode())
+    for X in (S, W) if weights is None else (S, W, weights):
+        h.update(repr(np.shape(X)).encode())
+        for a in range(0, len(X), chunk_size):
+            h.update(np.ascontiguousarray(X[a:a + chunk_size], dtype=np.float64).tobytes())
+    return h.hexdigest()
+
+
+# Function to fit a polynomial model (see fit_polynomial), or load it from the cache if the same fit was done before
+# Returns the model (with its fit_hash) and the info dict, with 'fit_hash' and 'cached' (True if loaded)
+def fit_polynomial_cached(S, W, degree, estimator='linearregression', alpha=1.0, solver='cholesky',
+                          cache_dir='.fit_cache', weights=None):
+    key = fit_hash(S, W, degree, estimator, alpha, solver, weights)
+    params_file = os.path.join(cache_dir, f'{key}.csv')
+    info_file = os.path.join(cache_dir, f'{key}.json')
+    if os.path.exists(params_file) and os.path.exists(info_file):
+        model = PolynomialModel.from_csv(params_file, np.shape(S)[1])
+        with open(info_file) as f:
+            info = json.load(f)
+        info['cached'] = True
+        return model, info
+
+    model, info = fit_polynomial(S, W, degree, estimator, alpha, solver, weights=weights)
+    model.fit_hash = key
+    info['fit_hash'] = key
+    os.makedirs(cache_dir, exist_ok=True)
+    model.to_csv(params_file)
+    with open(info_file, 'w') as f:
+        json.dump({k: float(v) if isinstance(v, np.floating) else v for k, v in info.items()}, f, indent=2)
+    info['cached'] = False
+    return model, info
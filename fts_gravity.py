@@ -0,0 +1,105 @@
+"""
+
+Shared model of the wrench produced by a known mass (gravity) on the sensor, for a given orientation.
+
+The orientation is given as RPY angles (ZYX Euler angles) of the sensor frame in the world frame,
+and the mass m has its COG at r in the sensor frame. Then, with F_w = [0, 0, -m * g]:
+F_s = R_ws^T * F_w and M_s = r x F_s (R_ws^T is the inverse of the rotation matrix).
+
+All the functions work on N orientations at once.
+
+PayloadCompensator subtracts the wrench of a payload (e.g. the tool mounted on the sensor) from the live wrench,
+given a stream of orientations: F_s = -m * g * (third row of R_ws) only depends on roll and pitch, so the trig
+of each orientation is computed once when it arrives, and each sensor sample only looks up the latest orientation.
+
+"""
+
+import json
+
+import numpy as np
+
+
+# Function to compute the rotation matrices from N sets of Euler angles at once
+# Rotation matrix for ZYX Euler angles = RPY, shape: (N, 3, 3)
+def rotation_matrices_from_euler_angles(roll, pitch, yaw):
+    roll, pitch, yaw = np.atleast_1d(roll, pitch, yaw)
+    cr, sr = np.cos(roll), np.sin(roll)
+    cp, sp = np.cos(pitch), np.sin(pitch)
+    cy, sy = np.cos(yaw), np.sin(yaw)
+    R = np.empty((len(roll), 3, 3))
+    R[:, 0, 0], R[:, 0, 1], R[:, 0, 2] = cy * cp, cy * sp * sr - sy * cr, cy * sp * cr + sy * sr
+    R[:, 1, 0], R[:, 1, 1], R[:, 1, 2] = sy * cp, sy * sp * sr + cy * cr, sy * sp * cr - cy * sr
+    R[:, 2, 0], R[:, 2, 1], R[:, 2, 2] = -sp, cp * sr, cp * cr
+    return R
+
+
+# Function to compute the wrench in the sensor frame for N poses at once, shape: (N, 6)
+# m: masses (N,), r: COG positions (N, 3), R_ws: rotation matrices (N, 3, 3)
+def compute_wrenches(m, r, R_ws, g=9.81):
+    F_w = np.zeros((len(R_ws), 3))
+    F_w[:, 2] = - np.asarray(m) * g
+    F_s = np.einsum('nji,nj->ni', R_ws, F_w)  # R_ws^T * F_w
+    M_s = np.cross(r, F_s)
+    return np.hstack([F_s, M_s])
+
+
+# Function to load the jig geometry (see jig_geometry.json): g, and {mass position: {'m': kg, 'r': [x, y, z]}}
+def load_jig_geometry(file):
+    with open(file) as f:
+        config = json.load(f)
+    return config['g'], {float(k): v for k, v in config['positions'].items()}
+
+
+# Function to compute the wrench of N poses given their mass positions and RPY angles (N x 3), shape: (N, 6)
+def pose_wrenches(pos, rpy, g, positions):
+    rpy = np.atleast_2d(rpy)
+    m = np.array([positions[float(p)]['m'] for p in np.atleast_1d(pos)])
+    r = np.array([positions[float(p)]['r'] for p in np.atleast_1d(pos)])
+    R_ws = rotation_matrices_from_euler_angles(rpy[:, 0], rpy[:, 1], rpy[:, 2])
+    return compute_wrenches(m, r, R_ws, g)
+
+
+# Live compensation of the wrench of a payload of mass m with its COG at r (sensor frame)
+# The payload wrench of the last orientations received is kept (with their timestamps) in a buffer
+class PayloadCompensator:
+
+    def __init__(self, m, r, g=9.81, capacity=4096):
+        self.weight = m * g
+        self.r = np.asarray(r, dtype=float)
+        self.capacity = capacity
+        self.t = np.empty(2 * capacity)
+        self.wrench = np.empty((2 * capacity, 6))
+        self.count = 0
+
+    # Function to add N orientations (timestamps (N,) in increasing order, RPY angles (N x 3))
+    def add_orientations(self, t, rpy):
+        rpy = np.atleast_2d(rpy)
+        if len(rpy) == 0:
+            return
+        sr, cr = np.sin(rpy[:, 0]), np.cos(rpy[:, 0])
+        sp, cp = np.sin(rpy[:, 1]), np.cos(rpy[:, 1])
+        F_s = -self.weight * np.column_stack([-sp, cp * sr, cp * cr])  # R_ws^T * [0, 0, -m * g]
+        # Keep only the last orientations when the buffer is full
+        if self.count + len(rpy) > len(self.t):
+            keep = min(self.count, max(self.capacity - len(rpy), 0))
+            self.t[:keep] = self.t[self.count - keep:self.count]
+            self.wrench[:keep] = self.wrench[self.count - keep:self.count]
+            self.count = keep
+            t, F_s = np.atleast_1d(t)[-len(self.t):], F_s[-len(self.t):]
+        n = len(F_s)
+        self.t[self.count:self.count + n] = t
+        self.wrench[self.count:self.count + n, :3] = F_s
+        self.wrench[self.count:self.count + n, 3:] = np.cross(self.r, F_s)
+        self.count += n
+
+    # Function to get the payload wrench at the timestamps t (N,), from the last orientation received before each
+    # (the first one for earlier timestamps), shape: (N, 6)
+    def payload_wrench(self, t):
+        if self.count == 0:
+            raise ValueError('No orientation received yet')
+        index = np.searchsorted(self.t[:self.count], t, side='right') - 1
+        return self.wrench[np.maximum(index, 0)]
+
+    # Function to subtract the payload wrench from the wrench W (N x 6) of the samples at the timestamps t (N,)
+    def compensate(self, t, W):
+        return W - self.payload_wrench(t)
@@ -0,0 +1,174 @@
+"""
+
+Live scrolling plot of the wrench (Fx to Mz) and the raw sensor values (s0 to s7) for the live readers
+(5_read_calibrated_values*.py), drawn in its own process so that the redraw never slows down the acquisition.
+
+The reader writes each sample into a fixed-size ring buffer in shared memory (push / push_batch: a copy
+and a counter increment, no locks and no queues), and the plot process reads the last window of samples
+at a fixed frame rate (fps), redrawing only the lines on a cached background (blitting).
+The y limits are checked twice per second, and the whole figure is only redrawn when they change.
+
+The frame rate actually reached is measured in the plot process: it is shown in the figure and
+printed by close() (with the target fps).
+
+The plot does not set the read rate of the readers: in 5_read_calibrated_values*.py it is limited by the
+printing of every sample on the terminal and the time.sleep(1/200) after it, with or without the plot.
+
+"""
+
+import multiprocessing as mp
+import time
+
+import numpy as np
+
+wrench_names = ['Fx', 'Fy', 'Fz', 'Mx', 'My', 'Mz']
+n_sensors = 8
+n_columns = len(wrench_names) + n_sensors
+
+
+# Live plot of the last window samples, drawn at fps frames per second in a separate process
+class LivePlot:
+
+    def __init__(self, window=2000, fps=30, title='Live wrench'):
+        self.window = window
+        self.fps = fps
+        self.title = title
+        self._ring = mp.RawArray('d', window * n_columns)  # rows: Fx..Mz, s0..s7
+        self._buffer = np.frombuffer(self._ring, dtype=np.float64).reshape(window, n_columns)
+        self._count = mp.RawValue('q', 0)  # samples pushed so far (the newest is at (count - 1) % window)
+        self._frames = mp.RawValue('q', 0)
+        self._elapsed = mp.RawValue('d', 0.0)
+        self._stop_event = mp.Event()
+        self._process = None
+
+    def start(self):
+        self._process = mp.Process(target=run_plot, name='live plot', daemon=True,
+                                   args=(self._ring, self._count, self.window, self.fps, self.title,
+                                         self._stop_event, self._frames, self._elapsed))
+        self._process.start()
+        return self
+
+    # Function to add one sample: wrench w (6,) and raw values s (8,)
+    def push(self, w, s):
+        n = self._count.value
+        row = self._buffer[n % self.window]
+        row[:len(wrench_names)] = np.ravel(w)
+        row[len(wrench_names):] = s
+        self._count.value = n + 1
+
+    # Function to add a batch of samples: W (N x 6) and S (N x 8)
+    def push_batch(self, W, S):
+        n = self._count.value
+        k = min(len(W), self.window)
+        index = np.arange(n + len(W) - k, n + len(W)) % self.window
+        self._buffer[index, :len(wrench_names)] = W[-k:]
+        self._buffer[index, len(wrench_names):] = S[-k:]
+        self._count.value = n + len(W)
+
+    # True while the plot window is open
+    def is_alive(self):
+        return self._process is not None and self._process.is_alive()
+
+    def close(self):
+        if self._process is None:
+            return
+        self._stop_event.set()
+        self._process.join(timeout=5)
+        if self._elapsed.value > 0:
+            print(f"Live plot: {self._frames.value} frames, {self._frames.value / self._elapsed.value:.1f} fps "
+                  f"measured (target {self.fps:g} fps)")
+        self._process = None
+
+
+# Function to get new y limits for the data, or None if the current ones still fit it well
+def new_limits(data, current):
+    finite = data[np.isfinite(data)]
+    if len(finite) == 0:
+        return None
+    low, high = finite.min(), finite.max()
+    span = max(high - low, 1e-6)
+    # Out of the limits, or using less than a quarter of them
+    if low < current[0] or high > current[1] or span < (current[1] - current[0]) / 4:
+        return low - 0.1 * span, high + 0.1 * span
+    return None
+
+
+# Function run by the plot process: redraws the lines of the last window samples fps times per second
+def run_plot(ring, count, window, fps, title, stop_event, frames, elapsed):
+    import matplotlib.pyplot as plt
+
+    buffer = np.frombuffer(ring, dtype=np.float64).reshape(window, n_columns)
+    fig, (ax_wrench, ax_raw) = plt.subplots(2, 1, sharex=True, figsize=(10, 7))
+    fig.canvas.manager.set_window_title(title)
+    x = np.arange(-window + 1, 1)
+    nan = np.full(window, np.nan)
+    lines = [ax_wrench.plot(x, nan, label=name, animated=True)[0] for name in wrench_names] + \
+            [ax_raw.plot(x, nan, label=f's{i}', animated=True)[0] for i in range(n_sensors)]
+    ax_wrench.set_ylabel('Wrench (N, Nm)')
+    ax_raw.set_ylabel('Raw sensor values')
+    ax_raw.set_xlabel('Samples')
+    ax_raw.set_xlim(x[0], x[-1])
+    ax_wrench.set_ylim(-1, 1)
+    ax_raw.set_ylim(0, 1023)  # full range of the raw values until the first check of the limits
+    for ax in (ax_wrench, ax_raw):
+        ax.legend(loc='upper left', ncol=8, fontsize='small')
+        ax.grid(True)
+    fps_text = ax_wrench.text(0.99, 0.95, '', transform=ax_wrench.transAxes, ha='right', va='top', animated=True)
+    artists = lines + [fps_text]
+    axes_columns = ((ax_wrench, slice(0, len(wrench_names))), (ax_raw, slice(len(wrench_names), None)))
+
+    plt.show(block=False)
+    fig.canvas.draw()
+    background = fig.canvas.copy_from_bbox(fig.bbox)
+    data = np.full((window, n_columns), np.nan)
+    period = 1.0 / fps
+    start = last_check = last_fps = time.perf_counter()
+    n_frames = frames_since = 0
+    try:
+        while not stop_event.is_set() and plt.fignum_exists(fig.number):
+            frame_start = time.perf_counter()
+
+            # Last window samples, oldest first (a row being written at the same time is shown in the next frame)
+            n = count.value
+            if n >= window:
+                data[:] = np.roll(buffer, -(n % window), axis=0)
+            elif n > 0:
+                data[window - n:] = buffer[:n]
+
+            # Check the y limits twice per second, and redraw the whole figure if they change
+            if frame_start - last_check > 0.5:
+                last_check = frame_start
+                changed = False
+                for ax, columns in axes_columns:
+                    limits = new_limits(data[:, columns], ax.get_ylim())
+                    if limits is not None:
+                        ax.set_ylim(*limits)
+                        changed = True
+                if changed:
+                    fig.canvas.draw()
+                    background = fig.canvas.copy_from_bbox(fig.bbox)
+
+            # Measured frame rate, updated every second
+            if frame_start - last_fps >= 1.0:
+                fps_text.set_text(f'{frames_since / (frame_start - last_fps):.1f} fps')
+                last_fps, frames_since = frame_start, 0
+
+            for k, line in enumerate(lines):
+                line.set_ydata(data[:, k])
+            fig.canvas.restore_region(background)
+            for artist in artists:
+                artist.axes.draw_artist(artist)
+            fig.canvas.blit(fig.bbox)
+            fig.canvas.flush_events()
+            n_frames += 1
+            frames_since += 1
+            frames.value = n_frames
+            elapsed.value = time.perf_counter() - start
+
+            # Wait for the next frame
+            remaining = period - (time.perf_counter() - frame_start)
+            if remaining > 0:
+                time.sleep(remaining)
+    except KeyboardInterrupt:
+        pass  # ctrl-C also reaches the plot process, the reader stops it
+    plt.close(fig)
@@ -0,0 +1,251 @@
+"""
+
+Shared polynomial calibration models of any degree: W = C + LS + QS^2 + ... (up to degree N).
+
+Each term (monomial) is a product of sensor values with non-decreasing indices, e.g. s0*s0*s3,
+and the terms are ordered by degree and then lexicographically, as in sklearn's PolynomialFeatures
+(so degree 2 gives the same L and Q layout as before).
+
+In the params csv files, each term is a column named after its sensor indices:
+L_s{i} for degree 1, Q_s{i}s{j} for degree 2, and P_s{i}s{j}s{k}... for degree 3 and higher,
+next to the bias C, one row per wrench value (Fx, Fy, Fz, Mx, My, Mz), and optionally
+the fit_hash column with the key of the fit (see fts_fit_cache.py).
+
+The monomials are built from their parent term (the same term without its last sensor),
+so each new term costs one multiplication:
+- features: batched feature matrix (datapoints x terms) for fitting and validation.
+- PolynomialModel.evaluate: nested (Horner-style) evaluation of a single sample, for the live reader.
+
+fit_polynomial solves the coefficients in a well-conditioned way: the sensor values are standardized
+(zero mean, unit variance) before building the terms, the terms are standardized again, and the
+least squares problem is solved with Cholesky (normal equations) or QR. The coefficients are then folded
+back into the raw-count C, L, Q... form, so the evaluation of the model does not change.
+
+fit_polynomial optionally takes per-sample weights (weighted least squares, see sample_weights): every mean,
+std and product of the normal equations is weighted, so no rows are duplicated.
+
+"""
+
+import re
+import time
+from itertools import combinations_with_replacement
+
+import numpy as np
+import pandas as pd
+from scipy.linalg import cho_factor, cho_solve, solve_triangular
+
+n_sensors = 8
+wrench_names = ['Fx', 'Fy', 'Fz', 'Mx', 'My', 'Mz']
+
+
+# Function to get the monomial index table: for each degree d (1 to degree), an array (terms x d) of sensor indices
+def monomials(degree, n=n_sensors):
+    return [np.array(list(combinations_with_replacement(range(n), d)), dtype=np.intp).reshape(-1, d)
+            for d in range(1, degree + 1)]
+
+
+# Function to get the column name of a term in the params files
+def term_name(term):
+    prefix = {1: 'L', 2: 'Q'}.get(len(term), 'P')
+    return prefix + '_' + ''.join(f's{i}' for i in term)
+
+
+# Function to get, for each degree d >= 2, the index of the parent of each term in the terms of degree d - 1
+def parents(table):
+    result = [None]
+    for d in range(1, len(table)):
+        lookup = {tuple(t): k for k, t in enumerate(table[d - 1])}
+        result.append(np.array([lookup[tuple(t[:-1])] for t in table[d]], dtype=np.intp))
+    return result
+
+
+# Function to compute the feature matrix (datapoints x terms) of S (datapoints x sensors) up to degree
+def features(S, degree, table=None, parent=None):
+    S_t = np.asarray(S, dtype=float).T  # one row per sensor, so that the terms are gathered as contiguous rows
+    table = monomials(degree, S_t.shape[0]) if table is None else table
+    parent = parents(table) if parent is None else parent
+    blocks = [S_t]
+    for d in range(1, len(table)):
+        blocks.append(blocks[-1][parent[d]] * S_t[table[d][:, -1]])
+    return np.vstack(blocks).T
+
+
+# Polynomial model loaded from (or saved to) a params csv file
+class PolynomialModel:
+
+    def __init__(self, C, coef, degree, n=n_sensors, fit_hash=None):
+        self.fit_hash = fit_hash  # key of the fit that produced the model (see fts_fit_cache.py), if known
+        self.C = np.asarray(C, dtype=float)  # Shape: (6,)
+        self.coef = np.asarray(coef, dtype=float)  # Shape: (6, terms), all the terms up to degree
+        self.degree = degree
+        self.n = n
+        self.table = monomials(degree, n)
+        self.parent = parents(self.table)
+        self.names = [term_name(t) for block in self.table for t in block]
+        # For the nested evaluation: coefficients of each degree, and where the children of each term start
+        sizes = np.cumsum([0] + [len(block) for block in self.table])
+        self._coef_by_degree = [self.coef[:, sizes[d]:sizes[d + 1]] for d in range(degree)]
+        self._child_starts = [None] + [np.flatnonzero(np.diff(p, prepend=-1)) for p in self.parent[1:]]
+
+    @classmethod
+    def from_csv(cls, file, n=n_sensors):
+        df = pd.read_csv(file)
+        # Terms present in the file (a missing term has coefficient 0)
+        terms = {col: tuple(int(i) for i in re.findall(r's(\d+)', col)) for col in df.columns
+                 if re.fullmatch(r'[LQP]_(s\d+)+', col)}
+        degree = max(len(t) for t in terms.values())
+        model = cls(df['C'].to_numpy(), np.zeros((len(df), 0)), degree, n)
+        coef = np.zeros((len(df), len(model.names)))
+        index = {name: k for k, name in enumerate(model.names)}
+        for col, term in terms.items():
+            coef[:, index[term_name(term)]] = df[col].to_numpy()
+        fit_hash = df['fit_hash'].iloc[0] if 'fit_hash' in df.columns else None
+        return cls(df['C'].to_numpy(), coef, degree, n, fit_hash)
+
+    def to_csv(self, file):
+        results = pd.DataFrame({'Wrench': wrench_names, 'C': self.C,
+                                **{name: self.coef[:, k] for k, name in enumerate(self.names)}})
+        if self.fit_hash is not None:
+            results['fit_hash'] = self.fit_hash
+        results.to_csv(file, index=False)
+
+    # Batched prediction for S (datapoints x sensors), shape: (datapoints, 6)
+    def predict(self, S):
+        return self.C + features(S, self.degree, self.table, self.parent) @ self.coef.T
+
+    # Nested (Horner-style) evaluation of one sample s (sensors,), shape: (6,)
+    # value(term) = coef(term) + sum over its children of s[last sensor of child] * value(child)
+    def evaluate(self, s):
+        s = np.asarray(s, dtype=float)
+        value = self._coef_by_degree[-1]
+        for d in range(self.degree - 1, 0, -1):
+            value = self._coef_by_degree[d - 1] + \
+                np.add.reduceat(value * s[self.table[d][:, -1]], self._child_starts[d], axis=1)
+        return self.C + value @ s
+
+
+# Function to fold the coefficients of a model in standardized sensor values z = (s - mu) / sigma
+# back into raw sensor values: each term prod(a_k * s_k + c_k) is expanded, with a = 1 / sigma and c = -mu / sigma
+def fold_standardization(b, coef_z, mu, sigma, degree):
+    a, c = 1.0 / sigma, -mu / sigma
+    table = monomials(degree, len(mu))
+    index = {tuple(t): k for k, t in enumerate(t for block in table for t in block)}
+    C = np.array(b, dtype=float)
+    coef = np.zeros_like(coef_z)
+    k = 0
+    for block in table:
+        for term in block:
+            # Every subset of the sensors of the term keeps s_k (factor a_k), the others give c_k
+            d = len(term)
+            for mask in range(1 << d):
+                kept = tuple(term[p] for p in range(d) if mask >> p & 1)
+                factor = np.prod([a[term[p]] if mask >> p & 1 else c[term[p]] for p in range(d)])
+                if kept:
+                    coef[:, index[kept]] += factor * coef_z[:, k]
+                else:
+                    C += factor * coef_z[:, k]
+            k += 1
+    return C, coef
+
+
+# Function to compute the (weighted) mean and std of each column of X
+def weighted_mean_std(X, w=None):
+    mean = np.average(X, axis=0, weights=w)
+    return mean, np.sqrt(np.average((X - mean) ** 2, axis=0, weights=w))
+
+
+# Function to compute per-sample weights for a weighted fit, constant within each pose (pose_id: pose of each sample)
+# scheme: None (no weights), 'pose' (inverse of the number of samples of the pose, so every pose counts
+# the same after the overload filtering) or 'inverse_variance' (inverse of the noise of the pose: the mean over
+# the channels of the variance of the sensor values within the pose, relative to the variance of all the data)
+# The weights are normalized to mean 1
+def sample_weights(S, pose_id, scheme=None):
+    if scheme is None:
+        return None
+    if pose_id is None:
+        raise ValueError('Sample weights need the pose_id of each sample')
+    _, index = np.unique(pose_id, return_inverse=True)
+    counts = np.bincount(index)
+    if scheme == 'pose':
+        weight = 1.0 / counts
+    elif scheme == 'inverse_variance':
+        S = np.asarray(S, dtype=float)
+        mean, std = weighted_mean_std(S)
+        std[std == 0] = 1.0
+        Z = (S - mean) / std
+        variance = np.zeros(len(counts))
+        for k in range(Z.shape[1]):
+            pose_mean = np.bincount(index, Z[:, k]) / counts
+            variance += np.bincount(index, Z[:, k] ** 2) / counts - pose_mean ** 2
+        variance = np.maximum(variance / Z.shape[1], 1e-12)
+        weight = 1.0 / variance
+    else:
+        raise ValueError(f'Invalid weighting scheme: {scheme}')
+    w = weight[index]
+    return w / w.mean()
+
+
+# Function to fit a polynomial model W = C + LS + QS^2 + ... from S (datapoints x sensors) and W (datapoints x 6)
+# estimator: 'linearregression', 'ridge' or 'lasso' (sklearn), alpha is applied to the standardized terms
+# solver (linearregression and ridge): 'cholesky' (normal equations, fast) or 'qr' (slower, more accurate)
+# weights: optional per-sample weights (datapoints,), for weighted least squares (see sample_weights)
+# Returns the model (in raw sensor values) and a dict with the fit time and conditioning diagnostics
+def fit_polynomial(S, W, degree, estimator='linearregression', alpha=1.0, solver='cholesky', diagnostics=True,
+                   weights=None):
+    start_time = time.perf_counter()
+    S = np.asarray(S, dtype=float)
+    W = np.asarray(W, dtype=float)
+    # Weights normalized to mean 1, so alpha has the same scale as without weights
+    w = None if weights is None else np.asarray(weights, dtype=float) / np.mean(weights)
+
+    # Standardize the sensor values, build the terms, and standardize the terms (weighted means and stds)
+    mu, sigma = weighted_mean_std(S, w)
+    sigma[sigma == 0] = 1.0
+    Z = features((S - mu) / sigma, degree)
+    z_mean, z_std = weighted_mean_std(Z, w)
+    z_std[z_std == 0] = 1.0
+    X = (Z - z_mean) / z_std
+    W_mean = np.average(W, axis=0, weights=w)
+
+    # Solve for the centered targets (the bias is recovered from the means)
+    if estimator in ('linearregression', 'ridge'):
+        penalty = alpha if estimator == 'ridge' else 0.0
+        if solver == 'qr':
+            # Ridge as least squares of the stacked system [X; sqrt(alpha) I] (rows scaled by sqrt(w) if weighted)
+            root_w = 1.0 if w is None else np.sqrt(w)[:, None]
+            A = root_w * X
+            B = root_w * (W - W_mean)
+            if penalty > 0:
+                A = np.vstack([A, np.sqrt(penalty) * np.eye(X.shape[1])])
+                B = np.vstack([B, np.zeros((X.shape[1], W.shape[1]))])
+            Q, R = np.linalg.qr(A)
+            beta = solve_triangular(R, Q.T @ B)
+        elif solver == 'cholesky':
+            # Weighted normal equations X^T diag(w) X beta = X^T diag(w) W
+            Xw = X if w is None else X * w[:, None]
+            G = Xw.T @ X
+            G[np.diag_indices_from(G)] += penalty
+            beta = cho_solve(cho_factor(G), Xw.T @ (W - W_mean))
+        else:
+            raise ValueError(f'Invalid solver: {solver}')
+    elif estimator == 'lasso':
+        from sklearn.linear_model import Lasso
+        # Coordinate descent on the precomputed Gram matrix (cheap iterations, so it can run until convergence)
+        lasso = Lasso(alpha=alpha, fit_intercept=False, precompute=True, max_iter=100000)
+        beta = lasso.fit(X, W - W_mean, sample_weight=w).coef_.T
+    else:
+        raise ValueError(f'Invalid estimator: {estimator}')
+
+    # Undo the standardization of the terms, and then of the sensor values
+    coef_z = (beta / z_std[:, None]).T  # Shape: (6, terms)
+    b = W_mean - coef_z @ z_mean
+    C, coef = fold_standardization(b, coef_z, mu, sigma, degree)
+    model = PolynomialModel(C, coef, degree, S.shape[1])
+
+    info = {'fit_time': time.perf_counter() - start_time}
+    if diagnostics:
+        # Condition number of the raw design matrix (with bias column) and of the standardized one
+        raw = np.column_stack([np.ones(len(S)), features(S, degree)])
+        info['cond_raw'] = np.linalg.cond(raw)
+        info['cond_standardized'] = np.linalg.cond(X)
+    return model, info
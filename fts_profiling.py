@@ -0,0 +1,120 @@
+"""
+
+Shared helpers to measure the resources used by the pipeline scripts.
+
+Every script from 1_ to 5_ accepts the --profile option (see Profiler.from_argv). With it:
+- the script runs under cProfile, and the stats are dumped in profiles/<script>.prof (open them with pstats
+  or snakeviz), with the 20 functions with the highest cumulative time printed at the end.
+- the wall time, RSS and peak RSS at the end of each stage of the script are printed and written
+  in profiles/<script>_stages.csv.
+- the traceback of an exception is printed, instead of only "Something went wrong".
+
+Only the main thread of the main process is profiled by cProfile (not the serial reader threads,
+nor the workers of the scripts that use a process pool), but their time shows in the stages.
+
+"""
+
+import atexit
+import cProfile
+import csv
+import os
+import pstats
+import sys
+import time
+import traceback
+
+
+# Function to get the peak resident memory (RSS) of this process in MB, or None if it is not available
+def peak_rss_mb():
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports KB, macOS reports bytes
+        return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+    except ImportError:
+        pass
+    try:
+        import psutil  # optional, for Windows
+        return psutil.Process().memory_info().peak_wset / 1024 ** 2
+    except (ImportError, AttributeError):
+        return None
+
+
+# Function to get the current resident memory (RSS) of this process in MB, or None if it is not available
+def rss_mb():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 ** 2
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import psutil  # optional, for Windows and macOS
+        return psutil.Process().memory_info().rss / 1024 ** 2
+    except ImportError:
+        return None
+
+
+# Profiler of a script: does nothing unless enabled
+# lap(stage) marks the end of a stage, and the results are saved when the script exits
+class Profiler:
+
+    def __init__(self, name, enabled=False, output_dir='profiles'):
+        self.name = name
+        self.enabled = enabled
+        self.output_dir = output_dir
+        self.stages = []
+        self._profile = None
+        self._finished = False
+        if enabled:
+            self._start_time = self._lap_time = time.perf_counter()
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+            atexit.register(self.finish)
+
+    # Profiler enabled by the --profile option, which is removed from the arguments (so argparse does not see it)
+    @classmethod
+    def from_argv(cls, name=None):
+        enabled = '--profile' in sys.argv[1:]
+        if enabled:
+            sys.argv = [arg for arg in sys.argv if arg != '--profile']
+        return cls(name or os.path.splitext(os.path.basename(sys.argv[0]))[0], enabled)
+
+    # Function to mark the end of a stage: wall time since the previous one, current and peak RSS
+    def lap(self, stage):
+        if not self.enabled or self._finished:
+            return
+        now = time.perf_counter()
+        rss, peak = rss_mb(), peak_rss_mb()
+        if rss is not None and peak is not None:
+            peak = max(peak, rss)  # both are sampled from different sources
+        self.stages.append({'stage': stage, 'wall_s': round(now - self._lap_time, 4),
+                            'rss_mb': None if rss is None else round(rss, 1),
+                            'peak_rss_mb': None if peak is None else round(peak, 1)})
+        self._lap_time = now
+
+    # Function to print the traceback of the exception being handled (only when profiling)
+    def exception(self):
+        if self.enabled:
+            traceback.print_exc()
+
+    # Function to save the cProfile stats and the stages (called when the script exits)
+    def finish(self):
+        if not self.enabled or self._finished:
+            return
+        self._profile.disable()
+        self.lap('end')
+        self._finished = True
+        os.makedirs(self.output_dir, exist_ok=True)
+        prof_file = os.path.join(self.output_dir, f'{self.name}.prof')
+        self._profile.dump_stats(prof_file)
+        stages_file = os.path.join(self.output_dir, f'{self.name}_stages.csv')
+        with open(stages_file, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=['stage', 'wall_s', 'rss_mb', 'peak_rss_mb'])
+            writer.writeheader()
+            writer.writerows(self.stages)
+
+        print(f"\nProfile of {self.name} ({time.perf_counter() - self._start_time:.2f} s):")
+        for s in self.stages:
+            print(f"  {s['stage']:<24} {s['wall_s']:>10.3f} s   RSS {s['rss_mb']} MB   peak {s['peak_rss_mb']} MB")
+        pstats.Stats(self._profile, stream=sys.stdout).sort_stats('cumulative').print_stats(20)
+        print(f"Saved {prof_file} and {stages_file}")
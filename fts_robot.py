@@ -0,0 +1,112 @@
+"""
+
+Robot-pose interfaces used by the session runner (1_run_session.py), and orientation streams
+used by the live payload compensation (5_read_compensated_values.py).
+
+A robot interface has two methods:
+- set_mass_position(pos): the mass of the jig is moved to the given position (always by hand).
+- move_to(roll, pitch, yaw): the sensor is moved to the given orientation (RPY, in radians),
+  and the orientation actually reached is returned (the one used to compute the wrench).
+
+ManualRobot asks the operator to do both (as the capture scripts do), and SimulatedRobot
+reaches every orientation instantly, for testing the session without a robot or operator.
+A driver for a real robot only has to implement the same two methods.
+
+An orientation stream has one method, read(): it returns the orientations received since the last call,
+as timestamps (N,) (same monotonic clock as SensorReader, see fts_serial.py) and RPY angles (N x 3, radians).
+UdpOrientationStream receives them from a local UDP port (one "roll pitch yaw" datagram per orientation,
+e.g. sent by the robot controller bridge), and SimulatedOrientationStream generates a slow sinusoidal motion.
+
+"""
+
+import socket
+import time
+
+import numpy as np
+
+
+# Operator moves the robot (e.g. from the teach pendant) and the mass
+class ManualRobot:
+
+    def set_mass_position(self, pos):
+        input(f"Move the mass to position {pos:g} and press Enter: ")
+
+    def move_to(self, roll, pitch, yaw):
+        while True:
+            user_input = input(f"Move the robot to R={roll:.3f} P={pitch:.3f} Y={yaw:.3f} and press Enter "
+                               f"(or type the actual roll pitch yaw): ").strip()
+            if not user_input:
+                return roll, pitch, yaw
+            try:
+                roll, pitch, yaw = [float(x) for x in user_input.replace(',', ' ').split()]
+                return roll, pitch, yaw
+            except ValueError:
+                print("Error: Input must be empty or three numbers (roll pitch yaw).")
+
+
+# Stand-in that reaches every orientation after move_time seconds
+class SimulatedRobot:
+
+    def __init__(self, move_time=0.0):
+        self.move_time = move_time
+        self.orientation = (0.0, 0.0, 0.0)
+
+    def set_mass_position(self, pos):
+        print(f"Simulated: mass at position {pos:g}")
+
+    def move_to(self, roll, pitch, yaw):
+        time.sleep(self.move_time)
+        self.orientation = (roll, pitch, yaw)
+        return self.orientation
+
+
+# Orientations received as "roll pitch yaw" datagrams on a local UDP port
+class UdpOrientationStream:
+
+    def __init__(self, port=5005, t0=None, host='127.0.0.1'):
+        self.t0 = time.monotonic() if t0 is None else t0
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((host, port))
+        self.sock.setblocking(False)
+        self.n_parse_errors = 0
+
+    def read(self):
+        t, rpy = [], []
+        while True:
+            try:
+                data = self.sock.recv(256)
+            except BlockingIOError:
+                break
+            timestamp = time.monotonic() - self.t0
+            try:
+                roll, pitch, yaw = [float(x) for x in data.decode().replace(',', ' ').split()]
+            except ValueError:
+                self.n_parse_errors += 1
+                continue
+            t.append(timestamp)
+            rpy.append((roll, pitch, yaw))
+        return np.array(t), np.array(rpy).reshape(-1, 3)
+
+    def close(self):
+        self.sock.close()
+
+
+# Stand-in for a robot streaming its orientation at rate Hz: each angle oscillates with the given
+# amplitude (radians) and period (seconds)
+class SimulatedOrientationStream:
+
+    def __init__(self, rate=250, amplitude=(0.5, 0.3, 0.0), period=(8.0, 5.0, 10.0), t0=None):
+        self.t0 = time.monotonic() if t0 is None else t0
+        self.rate = rate
+        self.amplitude = np.asarray(amplitude, dtype=float)
+        self.omega = 2 * np.pi / np.asarray(period, dtype=float)
+        self.n_sent = 0
+
+    def read(self):
+        n_due = int((time.monotonic() - self.t0) * self.rate) + 1
+        t = np.arange(self.n_sent, n_due) / self.rate
+        self.n_sent = max(n_due, self.n_sent)
+        return t, self.amplitude * np.sin(self.omega * t[:, None])
+
+    def close(self):
+        pass
@@ -0,0 +1,168 @@
+"""
+
+Shared serial reading code for the 3D printed sensor.
+
+The sensor sends one line per sample: < D, seq_number, error_mask, s0, s1, s2, s3, s4, s5, s6, s7 >
+
+SensorReader reads one serial port in its own thread, stamps every sample with a shared
+monotonic clock and counts the received, unparsable and dropped samples (gaps in seq_number).
+
+OverloadCounter checks the 8 raw values of each sample against the overload bounds at once,
+and keeps the saturation counters of each channel, so that the overloaded samples are not saved
+and an unusable pose is noticed during the capture.
+
+"""
+
+import csv
+import os
+import threading
+import time
+
+import numpy as np
+import serial
+
+n_sensors = 8
+overload_lower = 50
+overload_upper = 950
+
+
+# Function to parse one line from the sensor into (seq_number, error_mask, [s0, ..., s7])
+# Raises ValueError if the line is not well formatted
+def parse_line(data):
+    fields = data.split()
+    if len(fields) != 3 + n_sensors:
+        raise ValueError(f"expected {3 + n_sensors} fields, got {len(fields)}")
+    return int(fields[1]), int(fields[2]), [int(s) for s in fields[3:]]
+
+
+# Counter of the samples out of the overload bounds, for each channel (below lower / above upper)
+class OverloadCounter:
+
+    def __init__(self, n_channels=n_sensors, lower=overload_lower, upper=overload_upper, max_rejected_pct=5.0):
+        self.lower = lower
+        self.upper = upper
+        self.max_rejected_pct = max_rejected_pct  # above this, the pose is reported as unusable
+        self.n_samples = 0
+        self.n_rejected = 0
+        self.n_low = np.zeros(n_channels, dtype=np.int64)
+        self.n_high = np.zeros(n_channels, dtype=np.int64)
+        self.warned = False
+
+    # Function to check one sample (all channels at once), returns True if it is inside the bounds
+    def check(self, s):
+        s = np.asarray(s)
+        low = s < self.lower
+        high = s > self.upper
+        self.n_samples += 1
+        self.n_low += low
+        self.n_high += high
+        ok = not (low.any() or high.any())
+        if not ok:
+            self.n_rejected += 1
+        # Warn once during the capture if too many samples are rejected
+        if not self.warned and self.n_samples >= 200 and self.rejected_pct() > self.max_rejected_pct:
+            self.warned = True
+            print(f"Warning: {self.rejected_pct():.1f} % of the samples are overloaded "
+                  f"(channels {np.flatnonzero(self.n_low + self.n_high).tolist()}), this pose may be unusable")
+        return ok
+
+    def rejected_pct(self):
+        return 100.0 * self.n_rejected / self.n_samples if self.n_samples > 0 else 0.0
+
+    # Per-channel saturation percentages (below lower, above upper)
+    def stats(self):
+        n = max(self.n_samples, 1)
+        return {'samples': self.n_samples, 'rejected': self.n_rejected, 'rejected_pct': self.rejected_pct(),
+                **{f'low_pct_s{i}': 100.0 * v / n for i, v in enumerate(self.n_low)},
+                **{f'high_pct_s{i}': 100.0 * v / n for i, v in enumerate(self.n_high)}}
+
+    def report(self):
+        lines = [f"Overload: {self.n_rejected} of {self.n_samples} samples rejected ({self.rejected_pct():.2f} %)"]
+        n = max(self.n_samples, 1)
+        for i in np.flatnonzero(self.n_low + self.n_high):
+            lines.append(f"    s{i}: {100.0 * self.n_low[i] / n:.2f} % below {self.lower}, "
+                         f"{100.0 * self.n_high[i] / n:.2f} % above {self.upper}")
+        return '\n'.join(lines)
+
+    # Function to append the statistics of a capture (e.g. one pose file) to a csv file
+    def save(self, stats_file, name):
+        stats = {'file': name, **self.stats()}
+        new_file = not os.path.exists(stats_file) or os.path.getsize(stats_file) == 0
+        with open(stats_file, 'a', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(stats))
+            if new_file:
+                writer.writeheader()
+            writer.writerow(stats)
+
+
+# Thread reading samples from one serial port until stop() is called
+# on_sample(timestamp, seq_number, s) is called from the reader thread for every parsed sample
+# (only for the samples inside the overload bounds if reject_overload is True)
+class SensorReader(threading.Thread):
+
+    def __init__(self, port, on_sample, t0=None, baudrate=115200, name=None, reject_overload=True):
+        super().__init__(name=name or port, daemon=True)
+        self.port = port
+        self.baudrate = baudrate
+        self.on_sample = on_sample
+        self.reject_overload = reject_overload
+        self.overload = OverloadCounter()
+        self.t0 = time.monotonic() if t0 is None else t0  # shared clock origin
+        self._stop_event = threading.Event()
+        self.error = None
+
+        # Statistics
+        self.n_samples = 0
+        self.n_parse_errors = 0
+        self.n_dropped = 0
+        self.first_timestamp = None
+        self.last_timestamp = None
+        self._last_seq = None
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        try:
+            # Timeout so that the thread can notice stop() even if the sensor stops sending
+            with serial.Serial(self.port, self.baudrate, parity=serial.PARITY_NONE, timeout=0.5) as ser:
+                ser.reset_input_buffer()
+                while not self._stop_event.is_set():
+                    data = ser.readline()
+                    timestamp = time.monotonic() - self.t0
+                    if not data:
+                        continue
+                    try:
+                        seq_number, error_mask, s = parse_line(data)
+                    except ValueError:
+                        self.n_parse_errors += 1
+                        continue
+                    self._update_stats(timestamp, seq_number)
+                    if self.overload.check(s) or not self.reject_overload:
+                        self.on_sample(timestamp, seq_number, s)
+        except Exception as exp:
+            # Keep the exception so that the main thread can report it
+            self.error = exp
+
+    def _update_stats(self, timestamp, seq_number):
+        # Gaps in the sequence number are dropped samples (a smaller number means the counter restarted)
+        if self._last_seq is not None and seq_number > self._last_seq + 1:
+            self.n_dropped += seq_number - self._last_seq - 1
+        self._last_seq = seq_number
+        if self.first_timestamp is None:
+            self.first_timestamp = timestamp
+        self.last_timestamp = timestamp
+        self.n_samples += 1
+
+    def stats(self):
+        duration = (self.last_timestamp - self.first_timestamp) if self.n_samples > 1 else 0.0
+        expected = self.n_samples + self.n_dropped
+        return {
+            'port': self.port,
+            'samples': self.n_samples,
+            'rate_hz': self.n_samples / duration if duration > 0 else 0.0,
+            'parse_errors': self.n_parse_errors,
+            'dropped': self.n_dropped,
+            'dropped_pct': 100.0 * self.n_dropped / expected if expected > 0 else 0.0,
+            'overloaded': self.overload.n_rejected,
+        }
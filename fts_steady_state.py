@@ -0,0 +1,109 @@
+"""
+
+Shared steady-state detection for the raw values of the 3D printed sensor (s0 to s7).
+
+A window of samples is steady when, for every channel:
+- the standard deviation is at most max_std, or at most max_noise_ratio times the sensor noise of the window,
+  estimated from the differences of consecutive samples (std of the differences / sqrt(2)).
+  The noise of some channels is higher than max_std, but a swinging mass or a creeping sensor moves
+  slowly compared to the noise, so it raises the std of the window much more than the noise estimate.
+- the difference between the mean of its second half and its first half (drift) is at most max_drift,
+  or at most max_drift_std times the std of the window (only a drift that stands out of the noise is rejected).
+This rejects the samples taken while the mass is still swinging or the sensor is still creeping.
+
+steady_rows is used offline over a whole recording (steady_chunks for a recording read in chunks,
+with the same result as steady_rows on the whole recording), and SteadyStateDetector online during the capture.
+
+"""
+
+import numpy as np
+import pandas as pd
+
+window = 100  # samples (0.5 s at 200 Hz)
+max_std = 2.0  # raw counts (always steady below)
+max_drift = 1.0  # raw counts (always steady below)
+max_noise_ratio = 2.5  # std of the window / noise of the window
+max_drift_std = 1.0  # drift / std of the window
+
+
+# Function to check the statistics of windows (arrays: windows x channels), returns a boolean array (windows,)
+def steady_statistics(var, noise_var, drift):
+    std_ok = (var <= max_std ** 2) | (var <= max_noise_ratio ** 2 * noise_var)
+    drift_ok = (np.abs(drift) <= max_drift) | (np.abs(drift) <= max_drift_std * np.sqrt(var))
+    return (std_ok & drift_ok).all(axis=1)
+
+
+# Function to compute which windows S[i:i + w] (n x channels) are steady, using cumulative sums
+# Returns a boolean array of length n - w + 1
+def steady_windows(S, w=window):
+    S = np.asarray(S, dtype=float)
+    n = len(S)
+    if n < w:
+        return np.zeros(0, dtype=bool)
+    # Remove the first sample to keep the sums small (better numerical precision)
+    S = S - S[0]
+    zeros = np.zeros((1, S.shape[1]))
+    c = np.vstack([zeros, np.cumsum(S, axis=0)])
+    c2 = np.vstack([zeros, np.cumsum(S * S, axis=0)])
+    d = np.diff(S, axis=0)
+    cd2 = np.vstack([zeros, np.cumsum(d * d, axis=0)])
+    i = np.arange(n - w + 1)
+    h = w // 2
+    mean = (c[i + w] - c[i]) / w
+    var = np.maximum((c2[i + w] - c2[i]) / w - mean * mean, 0.0)
+    noise_var = (cd2[i + w - 1] - cd2[i]) / (2 * (w - 1))  # the w - 1 differences inside the window
+    drift = (c[i + w] - c[i + h]) / (w - h) - (c[i + h] - c[i]) / h
+    return steady_statistics(var, noise_var, drift)
+
+
+# Function to mark the rows covered by the steady windows (each steady window starting at i covers rows i to i + w - 1)
+def covered_rows(steady, n, w=window):
+    cover = np.zeros(n + 1, dtype=int)
+    starts = np.nonzero(steady)[0]
+    np.add.at(cover, starts, 1)
+    np.add.at(cover, starts + w, -1)
+    return np.cumsum(cover[:n]) > 0
+
+
+# Function to compute which samples of S (n x channels) belong to at least one steady window
+def steady_rows(S, w=window):
+    return covered_rows(steady_windows(S, w), len(S), w)
+
+
+# Function to trim a recording read in chunks (DataFrames), with the same result as steady_rows on the whole recording
+# Yields (rows, steady) for each chunk: the last w - 1 rows of a chunk are only yielded with the next chunk
+# (when all the windows covering them are known)
+def steady_chunks(chunks, columns, w=window):
+    pending, pending_cover = None, np.zeros(0, dtype=bool)
+    for chunk in chunks:
+        rows = chunk if pending is None else pd.concat([pending, chunk])
+        cover = covered_rows(steady_windows(rows[columns].to_numpy(), w), len(rows), w)
+        cover[:len(pending_cover)] |= pending_cover
+        final = max(len(rows) - (w - 1), 0)
+        if final > 0:
+            yield rows.iloc[:final], cover[:final]
+        pending, pending_cover = rows.iloc[final:], cover[final:]
+    if pending is not None and len(pending) > 0:
+        yield pending, pending_cover
+
+
+# Online detector: update() is called with every new sample and returns True if the last w samples are steady
+class SteadyStateDetector:
+
+    def __init__(self, n_channels=8, w=window):
+        self.w = w
+        self._buffer = np.zeros((w, n_channels))  # ring buffer with the last w samples
+        self._n = 0
+
+    def update(self, s):
+        self._buffer[self._n % self.w] = s
+        self._n += 1
+        if self._n < self.w:
+            return False
+        # Samples in chronological order
+        k = self._n % self.w
+        buffer = np.vstack([self._buffer[k:], self._buffer[:k]])
+        h = self.w // 2
+        drift = buffer[h:].mean(axis=0) - buffer[:h].mean(axis=0)
+        noise_var = (np.diff(buffer, axis=0) ** 2).mean(axis=0) / 2
+        return bool(steady_statistics(buffer.var(axis=0)[None], noise_var[None], drift[None])[0])
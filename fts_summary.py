@@ -0,0 +1,211 @@
+"""
+
+Summary statistics of the raw sensor values of a capture file, saved in a small sidecar file
+next to it (data_x.csv -> data_x.summary.json), so the raw rows do not have to be scanned again.
+
+For each channel (s0 to s7): the histogram of the values (exact counts, the raw values are integers
+from 0 to 1023), and derived from it: count, min, max, sum, sum of squares, mean, std,
+and the counts below the lower / above the upper overload bound. For the file: the number of rows,
+and the number of rows with any channel out of the bounds (the rows 2_merge_data.py filters out).
+
+All the statistics are integers, so the summaries of many files combine exactly (Summary.combine),
+and any quantile of the raw values can be read exactly from the histograms (Summary.quantiles).
+Large files and the merged samples of a dataset are summarized in one streaming pass
+(summarize_file, summarize_merged).
+A sidecar records the size and modification time of its file, and it is computed again if they change.
+
+"""
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from fts_dataset import load_columns, sensor_cols
+
+overload_lower = 50
+overload_upper = 950
+hist_bins = 1024  # 10-bit raw values (larger values extend the histogram)
+
+
+# Summary of the raw sensor values of one or many files
+class Summary:
+
+    def __init__(self, n_channels=len(sensor_cols), lower=overload_lower, upper=overload_upper):
+        self.lower = lower
+        self.upper = upper
+        self.n_rows = 0
+        self.n_rows_out_of_bounds = 0
+        # Exact counts of each value of each channel (all the per-channel statistics are derived from them)
+        self.hist = np.zeros((n_channels, hist_bins), dtype=np.int64)
+
+    # Function to add a block of raw values S (rows x channels, non-negative integers)
+    def update(self, S):
+        S = np.asarray(S)
+        if not np.issubdtype(S.dtype, np.integer):
+            S = S.astype(np.int64)
+        if len(S) == 0:
+            return
+        self.n_rows += len(S)
+        self.n_rows_out_of_bounds += int(((S.min(axis=1) < self.lower) | (S.max(axis=1) > self.upper)).sum())
+        bins = max(self.hist.shape[1], int(S.max()) + 1)
+        if bins > self.hist.shape[1]:
+            self.hist = np.pad(self.hist, ((0, 0), (0, bins - self.hist.shape[1])))
+        for k in range(S.shape[1]):
+            self.hist[k] += np.bincount(S[:, k], minlength=bins)
+
+    # Function to add another summary (same channels and bounds)
+    def merge(self, other):
+        if (other.lower, other.upper) != (self.lower, self.upper):
+            raise ValueError('Summaries with different overload bounds')
+        bins = max(self.hist.shape[1], other.hist.shape[1])
+        pad = lambda h: np.pad(h, ((0, 0), (0, bins - h.shape[1])))
+        self.hist = pad(self.hist) + pad(other.hist)
+        self.n_rows += other.n_rows
+        self.n_rows_out_of_bounds += other.n_rows_out_of_bounds
+        return self
+
+    # Function to combine the summaries of many files into a new one
+    @classmethod
+    def combine(cls, summaries):
+        summaries = list(summaries)
+        total = cls(len(summaries[0].hist), summaries[0].lower, summaries[0].upper) if summaries else cls()
+        for s in summaries:
+            total.merge(s)
+        return total
+
+    @property
+    def count(self):
+        return self.hist.sum(axis=1)
+
+    @property
+    def sum(self):
+        return self.hist @ np.arange(self.hist.shape[1], dtype=np.int64)
+
+    @property
+    def sum_sq(self):
+        return self.hist @ np.arange(self.hist.shape[1], dtype=np.int64) ** 2
+
+    @property
+    def n_low(self):
+        return self.hist[:, :self.lower].sum(axis=1)
+
+    @property
+    def n_high(self):
+        return self.hist[:, self.upper + 1:].sum(axis=1)
+
+    @property
+    def min(self):
+        return np.array([np.flatnonzero(h)[0] if h.any() else -1 for h in self.hist])
+
+    @property
+    def max(self):
+        return np.array([np.flatnonzero(h)[-1] if h.any() else -1 for h in self.hist])
+
+    @property
+    def mean(self):
+        return self.sum / np.maximum(self.count, 1)
+
+    @property
+    def std(self):
+        n = np.maximum(self.count, 1)
+        return np.sqrt(np.maximum(self.sum_sq / n - (self.sum / n) ** 2, 0.0))
+
+    # Function to get the values at the quantiles q (0 to 1) of each channel, shape: (channels, len(q))
+    # Exact: the value at index floor(q * (count - 1)) of the sorted values, found in the cumulative histogram
+    def quantiles(self, q):
+        q = np.atleast_1d(np.asarray(q, dtype=float))
+        cumulative = np.cumsum(self.hist, axis=1)
+        result = np.full((len(self.count), len(q)), -1, dtype=np.int64)
+        for k in range(len(self.count)):
+            if self.count[k] > 0:
+                rank = np.floor(q * (self.count[k] - 1)).astype(np.int64)
+                result[k] = np.searchsorted(cumulative[k], rank, side='right')
+        return result
+
+    # Table with one row per channel
+    def table(self):
+        return pd.DataFrame({'channel': sensor_cols[:len(self.count)], 'count': self.count, 'min': self.min,
+                             'max': self.max, 'mean': self.mean, 'std': self.std,
+                             f'below_{self.lower}': self.n_low, f'above_{self.upper}': self.n_high})
+
+    def to_dict(self):
+        channels = {}
+        for k, name in enumerate(sensor_cols[:len(self.count)]):
+            lo, hi = self.min[k], self.max[k]
+            channels[name] = {
+                'count': int(self.count[k]), 'min': int(lo), 'max': int(hi),
+                'mean': float(self.mean[k]), 'std': float(self.std[k]),
+                'sum': int(self.sum[k]), 'sum_sq': int(self.sum_sq[k]),
+                'n_low': int(self.n_low[k]), 'n_high': int(self.n_high[k]),
+                # Histogram only from min to max (the values out of this range have 0 counts)
+                'hist_start': int(max(lo, 0)), 'hist': self.hist[k, max(lo, 0):hi + 1].tolist(),
+            }
+        return {'lower': self.lower, 'upper': self.upper, 'n_rows': self.n_rows,
+                'n_rows_out_of_bounds': self.n_rows_out_of_bounds, 'channels': channels}
+
+    @classmethod
+    def from_dict(cls, d):
+        channels = list(d['channels'].values())
+        summary = cls(len(channels), d['lower'], d['upper'])
+        summary.n_rows = d['n_rows']
+        summary.n_rows_out_of_bounds = d['n_rows_out_of_bounds']
+        bins = max([hist_bins] + [c['hist_start'] + len(c['hist']) for c in channels])
+        summary.hist = np.zeros((len(channels), bins), dtype=np.int64)
+        for k, c in enumerate(channels):
+            summary.hist[k, c['hist_start']:c['hist_start'] + len(c['hist'])] = c['hist']
+        return summary
+
+
+# Function to get the sidecar file of a capture file
+def sidecar_path(file):
+    return os.path.splitext(file)[0] + '.summary.json'
+
+
+# Function to compute the summary of the raw values of a csv file, reading it in chunks
+def summarize_file(file, chunksize=500000):
+    summary = Summary()
+    for chunk in pd.read_csv(file, usecols=sensor_cols, dtype={c: np.int64 for c in sensor_cols}, chunksize=chunksize):
+        summary.update(chunk[sensor_cols].to_numpy())
+    return summary
+
+
+# Function to compute the summary of the merged samples of a dataset (see fts_dataset.py) in one pass,
+# reading the memory-mapped columns in blocks of rows
+def summarize_merged(directory, chunk_rows=1 << 20):
+    columns = load_columns(directory, sensor_cols)
+    summary = Summary()
+    n = len(columns[sensor_cols[0]])
+    for a in range(0, n, chunk_rows):
+        summary.update(np.column_stack([columns[c][a:a + chunk_rows] for c in sensor_cols]))
+    return summary
+
+
+# Function to write the sidecar of a file (computing its summary if not given)
+def write_summary(file, summary=None):
+    summary = summarize_file(file) if summary is None else summary
+    stat = os.stat(file)
+    with open(sidecar_path(file), 'w') as f:
+        json.dump({'file': os.path.basename(file), 'size': stat.st_size, 'mtime': stat.st_mtime,
+                   **summary.to_dict()}, f)
+    return summary
+
+
+# Function to read the sidecar of a file, or None if it does not exist or the file changed after it was written
+def read_summary(file):
+    try:
+        with open(sidecar_path(file)) as f:
+            d = json.load(f)
+    except (OSError, ValueError):
+        return None
+    stat = os.stat(file)
+    if d.get('size') != stat.st_size or d.get('mtime') != stat.st_mtime:
+        return None
+    return Summary.from_dict(d)
+
+
+# Function to get the summary of a file from its sidecar, creating (or updating) the sidecar if needed
+def load_summary(file):
+    summary = read_summary(file)
+    return write_summary(file) if summary is None else summary